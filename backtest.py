@@ -0,0 +1,42 @@
+from model.backtest import backtest
+from model.state import league_format
+
+from concurrent.futures import ProcessPoolExecutor
+
+import json
+import logging
+import os
+import re
+import sys
+import time
+import yaml
+
+def backtest_league(league_name):
+    events = json.loads(open(f"fixtures/{league_name}.json").read())
+    return backtest(events = events,
+                    seed = 42,
+                    **league_format(league_name))["summary"]
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.WARNING,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        datefmt='%H:%M:%S'
+    )
+
+    try:
+        league_names = sys.argv[1:] if len(sys.argv) > 1 else sorted([file_name.split(".")[0]
+                                                                        for file_name in os.listdir("fixtures")
+                                                                        if file_name.endswith(".json")])
+        for league_name in league_names:
+            if not re.search("^\\D{3}\\d{1}", league_name):
+                raise RuntimeError(f"league {league_name} is invalid")
+            if not os.path.exists(f"fixtures/{league_name}.json"):
+                raise RuntimeError(f"fixtures/{league_name}.json does not exist")
+        start = time.perf_counter()
+        with ProcessPoolExecutor() as executor:
+            summaries = dict(zip(league_names, executor.map(backtest_league, league_names)))
+        print(yaml.safe_dump(summaries, default_flow_style = False))
+        print(f"Backtested {len(league_names)} leagues in {time.perf_counter() - start:.1f}s")
+    except RuntimeError as error:
+        print(f"Error: {error}")
@@ -1,5 +1,6 @@
 from model.solver import RatingRange
 from model.main import simulate
+from model.state import league_format
 
 import json
 import logging
@@ -43,13 +44,13 @@ if __name__ == "__main__":
         winner_payoff = f"1|{len(team_names)-1}x0"
         markets = [{"name": "Winner",
                     "payoff": winner_payoff}]
-        rounds = 2 if "SCO" in league_name else 1
         resp = simulate(ratings = ratings,
                         training_set = training_set,
                         events = events,
                         handicaps = {},
                         markets = markets,
-                        rounds = rounds)
+                        outputs = ["teams", "outright_marks"],
+                        **league_format(league_name))
         print(yaml.safe_dump(sorted([{"name": team["name"],
                                       "points": team["points"],
                                       "ppg_rating": team["points_per_game_rating"]}
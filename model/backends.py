@@ -0,0 +1,213 @@
+from model.kernel import init_matrices, dixon_coles_corners
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# backend interface:
+# - score_matrices(home_lambdas, away_lambdas, n, rho) -> (n_events, n, n)
+# - sample_scores(cdfs, uniforms) -> (n_fixtures, n_paths) flattened score cell indexes
+# - accumulate_points(points, home_indexes, away_indexes, scores, n, gd_multiplier, mask = None) updates points in place where mask is True
+# - simulate_points(...) is sample_scores followed by accumulate_points
+# - positions(points) -> (n_teams, n_paths) zero-based league positions
+# - position_counts(points) -> (n_teams, n_teams) counts of each team finishing in each position
+
+class NumpyBackend:
+    """Reference implementation of the backend interface, which NumbaBackend must match"""
+
+    name = "numpy"
+
+    def score_matrices(self, home_lambdas, away_lambdas, n, rho):
+        return init_matrices(home_lambdas = home_lambdas,
+                             away_lambdas = away_lambdas,
+                             n = n,
+                             rho = rho)
+
+    def sample_scores(self, cdfs, uniforms):
+        last = cdfs.shape[1] - 1
+        return np.array([np.minimum(np.searchsorted(cdf, fixture_uniforms, side = "right"), last)
+                         for cdf, fixture_uniforms in zip(cdfs, uniforms)], dtype = np.int64).reshape(uniforms.shape)
+
+    def accumulate_points(self, points, home_indexes, away_indexes, scores, n, gd_multiplier, mask = None):
+        home_goals, away_goals = scores // n, scores % n
+        home_points = 3 * (home_goals > away_goals) + (home_goals == away_goals)
+        away_points = 3 * (away_goals > home_goals) + (home_goals == away_goals)
+        goal_difference = home_goals - away_goals
+        weights = 1 if mask is None else mask
+        np.add.at(points, home_indexes, weights * (home_points + gd_multiplier * goal_difference))
+        np.add.at(points, away_indexes, weights * (away_points - gd_multiplier * goal_difference))
+
+    def simulate_points(self, points, home_indexes, away_indexes, cdfs, uniforms, n, gd_multiplier, mask = None):
+        scores = self.sample_scores(cdfs, uniforms)
+        self.accumulate_points(points, home_indexes, away_indexes, scores, n, gd_multiplier, mask)
+
+    def positions(self, points):
+        return len(points) - np.argsort(np.argsort(points, axis=0), axis=0) - 1
+
+    def position_counts(self, points):
+        n_teams = len(points)
+        positions = self.positions(points)
+        cells = np.arange(n_teams)[:, np.newaxis] * n_teams + positions
+        return np.bincount(cells.flatten(), minlength = n_teams * n_teams).reshape(n_teams, n_teams)
+
+if numba is not None:
+
+    # paths are split into blocks across threads; within a block fixtures are the outer loop so rows are read contiguously
+    PathBlockSize = 256
+
+    GuideSize = 64
+
+    @numba.njit(cache = True)
+    def _score_matrices(home_lambdas, away_lambdas, n, corners):
+        matrices = np.empty((len(home_lambdas), n, n))
+        home_probs, away_probs = np.empty(n), np.empty(n)
+        for e in range(len(home_lambdas)):
+            home_probs[0], away_probs[0] = np.exp(-home_lambdas[e]), np.exp(-away_lambdas[e])
+            for k in range(1, n):
+                home_probs[k] = home_probs[k - 1] * home_lambdas[e] / k
+                away_probs[k] = away_probs[k - 1] * away_lambdas[e] / k
+            for i in range(n):
+                for j in range(n):
+                    matrices[e, i, j] = home_probs[i] * away_probs[j]
+            for i in range(2):
+                for j in range(2):
+                    matrices[e, i, j] *= corners[e, i, j]
+        return matrices
+
+    @numba.njit(cache = True)
+    def _guide_tables(cdfs):
+        """Per fixture, the first cell whose cdf exceeds k / GuideSize, so sampling starts next to its answer"""
+        n_fixtures, n_cells = cdfs.shape
+        guides = np.empty((n_fixtures, GuideSize), dtype = np.int64)
+        for f in range(n_fixtures):
+            j = 0
+            for k in range(GuideSize):
+                while j < n_cells - 1 and cdfs[f, j] <= k / GuideSize:
+                    j += 1
+                guides[f, k] = j
+        return guides
+
+    @numba.njit(cache = True, inline = "always")
+    def _sample_score(cdf, guide, u):
+        """First cell whose cdf exceeds u, clipped to the last cell, as np.searchsorted(side = "right")"""
+        j = guide[int(u * GuideSize)]
+        while j < len(cdf) - 1 and cdf[j] <= u:
+            j += 1
+        return j
+
+    @numba.njit(cache = True, parallel = True)
+    def _sample_scores(cdfs, uniforms):
+        n_fixtures, n_paths = uniforms.shape
+        scores = np.empty((n_fixtures, n_paths), dtype = np.int64)
+        guides = _guide_tables(cdfs)
+        for f in numba.prange(n_fixtures):
+            for p in range(n_paths):
+                scores[f, p] = _sample_score(cdfs[f], guides[f], uniforms[f, p])
+        return scores
+
+    @numba.njit(cache = True, inline = "always")
+    def _add_result(points, home_index, away_index, home_goals, away_goals, p, gd_multiplier):
+        if home_goals > away_goals:
+            points[home_index, p] += 3
+        elif away_goals > home_goals:
+            points[away_index, p] += 3
+        else:
+            points[home_index, p] += 1
+            points[away_index, p] += 1
+        points[home_index, p] += gd_multiplier * (home_goals - away_goals)
+        points[away_index, p] += gd_multiplier * (away_goals - home_goals)
+
+    @numba.njit(cache = True, parallel = True)
+    def _accumulate_points(points, home_indexes, away_indexes, scores, n, gd_multiplier, mask):
+        n_fixtures, n_paths = scores.shape
+        n_blocks = (n_paths + PathBlockSize - 1) // PathBlockSize
+        for b in numba.prange(n_blocks):
+            for f in range(n_fixtures):
+                for p in range(b * PathBlockSize, min(n_paths, (b + 1) * PathBlockSize)):
+                    if mask[f, p]:
+                        _add_result(points, home_indexes[f], away_indexes[f], scores[f, p] // n, scores[f, p] % n, p, gd_multiplier)
+
+    @numba.njit(cache = True, parallel = True)
+    def _simulate_points(points, home_indexes, away_indexes, cdfs, uniforms, n, gd_multiplier, mask):
+        """Sampling and accumulation fused into one pass over each block of paths"""
+        n_fixtures, n_paths = uniforms.shape
+        n_blocks = (n_paths + PathBlockSize - 1) // PathBlockSize
+        guides = _guide_tables(cdfs)
+        for b in numba.prange(n_blocks):
+            for f in range(n_fixtures):
+                for p in range(b * PathBlockSize, min(n_paths, (b + 1) * PathBlockSize)):
+                    if mask[f, p]:
+                        score = _sample_score(cdfs[f], guides[f], uniforms[f, p])
+                        _add_result(points, home_indexes[f], away_indexes[f], score // n, score % n, p, gd_multiplier)
+
+    @numba.njit(cache = True, parallel = True)
+    def _positions(points):
+        n_teams, n_paths = points.shape
+        positions = np.empty((n_teams, n_paths), dtype = np.int64)
+        for p in numba.prange(n_paths):
+            for a in range(n_teams):
+                position = 0
+                for b in range(n_teams):
+                    if (points[b, p] > points[a, p] or
+                        (points[b, p] == points[a, p] and b < a)):
+                        position += 1
+                positions[a, p] = position
+        return positions
+
+    @numba.njit(cache = True)
+    def _position_counts(positions):
+        n_teams, n_paths = positions.shape
+        counts = np.zeros((n_teams, n_teams), dtype = np.int64)
+        for a in range(n_teams):
+            for p in range(n_paths):
+                counts[a, positions[a, p]] += 1
+        return counts
+
+class NumbaBackend(NumpyBackend):
+
+    name = "numba"
+
+    def score_matrices(self, home_lambdas, away_lambdas, n, rho):
+        home_lambdas = np.asarray(home_lambdas, dtype = float)
+        away_lambdas = np.asarray(away_lambdas, dtype = float)
+        return _score_matrices(home_lambdas,
+                               away_lambdas,
+                               n,
+                               dixon_coles_corners(home_lambdas, away_lambdas, rho))
+
+    def sample_scores(self, cdfs, uniforms):
+        return _sample_scores(cdfs, uniforms)
+
+    def accumulate_points(self, points, home_indexes, away_indexes, scores, n, gd_multiplier, mask = None):
+        if mask is None:
+            mask = np.ones(scores.shape, dtype = np.bool_)
+        _accumulate_points(points, home_indexes, away_indexes, scores, n, gd_multiplier, mask)
+
+    def simulate_points(self, points, home_indexes, away_indexes, cdfs, uniforms, n, gd_multiplier, mask = None):
+        if mask is None:
+            mask = np.ones(uniforms.shape, dtype = np.bool_)
+        _simulate_points(points, home_indexes, away_indexes, cdfs, uniforms, n, gd_multiplier, mask)
+
+    def positions(self, points):
+        return _positions(np.ascontiguousarray(points))
+
+    def position_counts(self, points):
+        return _position_counts(self.positions(points))
+
+Backends = {"numpy": NumpyBackend()}
+
+if numba is not None:
+    Backends["numba"] = NumbaBackend()
+
+def init_backend(backend = "numpy"):
+    """Accepts a backend name or instance"""
+    if not isinstance(backend, str):
+        return backend
+    if backend not in Backends:
+        raise RuntimeError(f"backend {backend} is not available")
+    return Backends[backend]
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,180 @@
+from model.kernel import Rho, init_matrices, batch_match_odds
+from model.markets import init_markets
+from model.main import calc_position_probabilities, calc_outright_marks
+from model.rng import spawn_seeds
+from model.simulator import SimPoints
+from model.solver import RatingsSolver, MatchOdds, market_probabilities
+from model.state import init_league_table, update_league_table, sort_league_table, calc_season_fixtures
+import numpy as np
+import logging
+import time
+
+Metrics = ["log_loss", "brier", "rms"]
+
+def filter_team_names(events):
+    return sorted(list({team_name
+                        for event in events
+                        for team_name in event["name"].split(" vs ")}))
+
+def calc_matchdays(events, n_teams):
+    """Events in date order, grouped into matchdays of at least n_teams // 2 events without splitting a date"""
+    matchdays, matchday = [], []
+    for date in sorted(list({event["date"] for event in events})):
+        matchday += [event for event in events if event["date"] == date]
+        if len(matchday) >= n_teams // 2:
+            matchdays.append(matchday)
+            matchday = []
+    if matchday != []:
+        matchdays.append(matchday)
+    return matchdays
+
+def calc_outcomes(events):
+    """Index of each event's result in match odds order (home, draw, away)"""
+    return np.array([1 + np.sign(event["score"][1] - event["score"][0])
+                     for event in events], dtype = int)
+
+def calc_match_odds_metrics(probabilities, outcomes, market_probs = None):
+    """Mean log loss and Brier score against outcomes, plus mean RMS error against market probabilities if given"""
+    probabilities = np.asarray(probabilities, dtype = float)
+    actual = np.eye(3)[outcomes]
+    metrics = {"log_loss": float(-np.mean(np.log(np.maximum(probabilities[np.arange(len(outcomes)), outcomes], 1e-12)))),
+               "brier": float(np.mean(np.sum((probabilities - actual) ** 2, axis = 1)))}
+    if market_probs is not None:
+        metrics["rms"] = float(np.mean(np.sqrt(np.mean((probabilities - np.asarray(market_probs)) ** 2, axis = 1))))
+    return metrics
+
+def price_match_odds(events, ratings, home_advantage, rho = Rho):
+    event_teams = [event["name"].split(" vs ") for event in events]
+    home_ratings = np.array([ratings[home_team_name] for home_team_name, _ in event_teams])
+    away_ratings = np.array([ratings[away_team_name] for _, away_team_name in event_teams])
+    return batch_match_odds(init_matrices(home_lambdas = home_ratings * home_advantage,
+                                          away_lambdas = away_ratings,
+                                          rho = rho))
+
+def price_outrights(league_table, remaining_fixtures, markets, solution, n_paths, seed = None, backend = "numpy",
+                    split = None, split_fixtures = []):
+    sim_points = SimPoints(league_table, n_paths,
+                           seed = seed,
+                           backend = backend)
+    sim_points.simulate_fixtures(event_names = remaining_fixtures,
+                                 ratings = solution["ratings"],
+                                 home_advantage = solution["home_advantage"],
+                                 rho = solution["rho"])
+    if split_fixtures:
+        sim_points.simulate_split(event_names = split_fixtures,
+                                  ratings = solution["ratings"],
+                                  home_advantage = solution["home_advantage"],
+                                  rho = solution["rho"],
+                                  split_size = split["size"])
+    return calc_outright_marks(position_probabilities = calc_position_probabilities(sim_points = sim_points,
+                                                                                    markets = markets),
+                               markets = markets)
+
+def summarise(steps):
+    """Event-weighted metrics and latency totals across steps"""
+    n_events = sum([step["n_events"] for step in steps])
+    summary = {"n_steps": len(steps),
+               "n_events": n_events}
+    for prefix in ["model", "market"]:
+        for metric in Metrics:
+            values = [(step[prefix][metric], step["n_events"]) for step in steps
+                      if metric in step[prefix]]
+            if values != [] and n_events > 0:
+                summary[f"{prefix}_{metric}"] = sum([value * n for value, n in values]) / n_events
+    for key in ["solve_time", "price_time", "step_time"]:
+        summary[f"total_{key}"] = sum([step[key] for step in steps])
+        summary[f"mean_{key}"] = summary[f"total_{key}"] / len(steps) if steps else 0
+    return summary
+
+def backtest(events,
+             rounds = 1,
+             split = None,
+             window = 3,
+             min_events = None,
+             n_paths = 1000,
+             max_iterations = 500,
+             optimiser = "genetic",
+             fit_markets = [MatchOdds],
+             rho = Rho,
+             seed = None,
+             backend = "numpy"):
+    """Walk-forward replay of a league, re-solving and pricing before each matchday"""
+    # ratings are solved on the trailing window * n_teams results, as demo.py builds its training set, warm started from the previous matchday
+    # each step records calibration against outcomes and closing odds, for the model and the closing odds themselves, and solve and pricing latency
+    logger = logging.getLogger(__name__)
+    team_names = filter_team_names(events)
+    n_teams = len(team_names)
+    if min_events is None:
+        min_events = n_teams
+    markets = [{"name": "Winner",
+                "payoff": f"1|{n_teams - 1}x0"}]
+    init_markets(team_names, markets)
+    league_table = init_league_table(team_names, {})
+    matchdays = calc_matchdays(events, n_teams)
+    step_seeds = spawn_seeds(seed, len(matchdays))
+    solver = RatingsSolver()
+    results, solution, steps = [], None, []
+    for matchday, step_seed in zip(matchdays, step_seeds):
+        if len(results) >= min_events:
+            solve_seed, simulation_seed = spawn_seeds(step_seed, 2)
+            start = time.perf_counter()
+            solution = solver.solve(events = results[-window * n_teams:],
+                                    ratings = {team_name: 1 for team_name in team_names},
+                                    rho = rho,
+                                    max_iterations = max_iterations,
+                                    fit_markets = fit_markets,
+                                    optimiser = optimiser,
+                                    backend = backend,
+                                    seed = solve_seed,
+                                    warm_start = solution,
+                                    results = results)
+            solved = time.perf_counter()
+            priced_events = [event for event in matchday
+                             if "score" in event and MatchOdds in event]
+            probabilities = price_match_odds(events = priced_events,
+                                             ratings = solution["ratings"],
+                                             home_advantage = solution["home_advantage"],
+                                             rho = solution["rho"])
+            marks = []
+            if n_paths:
+                _, remaining_fixtures, split_fixtures = calc_season_fixtures(team_names = team_names,
+                                                                             events = results,
+                                                                             handicaps = {},
+                                                                             rounds = rounds,
+                                                                             split = split)
+                marks = price_outrights(league_table = sort_league_table(league_table),
+                                        remaining_fixtures = remaining_fixtures,
+                                        markets = markets,
+                                        solution = solution,
+                                        n_paths = n_paths,
+                                        seed = simulation_seed,
+                                        backend = backend,
+                                        split = split,
+                                        split_fixtures = split_fixtures)
+            priced = time.perf_counter()
+            outcomes = calc_outcomes(priced_events)
+            market_probs = np.array([market_probabilities(event[MatchOdds]["prices"])
+                                     for event in priced_events]).reshape(-1, 3)
+            step = {"date": matchday[0]["date"],
+                    "n_events": len(priced_events),
+                    "n_training_events": len(results[-window * n_teams:]),
+                    "solver_error": solution["error"],
+                    "home_advantage": solution["home_advantage"],
+                    "rho": solution["rho"],
+                    "model": calc_match_odds_metrics(probabilities, outcomes, market_probs) if priced_events else {},
+                    "market": calc_match_odds_metrics(market_probs, outcomes) if priced_events else {},
+                    "marks": {mark["team"]: mark["mark"] for mark in marks},
+                    "solve_time": solved - start,
+                    "price_time": priced - solved,
+                    "step_time": priced - start}
+            steps.append(step)
+            logger.info(f"{step['date']}: {step['n_events']} events, solver error {step['solver_error']:.4f}, {1000 * step['step_time']:.0f}ms")
+        for event in matchday:
+            if "score" in event:
+                update_league_table(league_table, event)
+                results.append(event)
+    return {"steps": steps,
+            "summary": summarise(steps)}
+
+if __name__ == "__main__":
+    pass
@@ -1,3 +1,5 @@
+from functools import lru_cache
+
 import math
 import numpy as np
 
@@ -11,22 +13,209 @@ def factorial_vectorized(k):
 def poisson_prob(lmbda, k):
     return (lmbda ** k) * np.exp(-lmbda) / factorial_vectorized(k)
 
-def dixon_coles_adjustment(i, j, rho):
-    if i == 0 and j == 0:
-        return 1 - (i * j * rho)
-    elif i == 0 and j == 1:
-        return 1 + (rho / 2)
-    elif i == 1 and j == 0:
-        return 1 + (rho / 2)
-    elif i == 1 and j == 1:
-        return 1 - rho
-    else:
-        return 1
+# fitted rho sits around -0.1 to -0.15 on the shipped leagues (ENG1 -0.11, ITA1 -0.13), so the fixed default is negative
+Rho = -0.1
+
+def dixon_coles_corners(home_lambdas, away_lambdas, rho):
+    """Dixon-Coles factors for the 2x2 low score corner, shape (n_events, 2, 2)"""
+    home_lambdas = np.asarray(home_lambdas, dtype = float)
+    away_lambdas = np.asarray(away_lambdas, dtype = float)
+    corners = np.empty((len(home_lambdas), 2, 2))
+    corners[:, 0, 0] = 1 - home_lambdas * away_lambdas * rho
+    corners[:, 0, 1] = 1 + home_lambdas * rho
+    corners[:, 1, 0] = 1 + away_lambdas * rho
+    corners[:, 1, 1] = 1 - rho
+    # factors are floored at zero, as 1 - home_lambda * away_lambda * rho and 1 + lambda * rho turn negative for large lambdas
+    return np.maximum(corners, 0)
+
+def apply_dixon_coles(matrices, home_lambdas, away_lambdas, rho):
+    """In-place Dixon-Coles update of the 2x2 low score corner across a batch of matrices"""
+    matrices[:, :2, :2] *= dixon_coles_corners(home_lambdas, away_lambdas, rho)
+    return matrices
+
+@lru_cache(maxsize = None)
+def goals_factorials(n):
+    goals = np.arange(n)
+    return goals, factorial_vectorized(goals)
+
+@lru_cache(maxsize = None)
+def goals_log_factorials(n):
+    goals, factorials = goals_factorials(n)
+    return goals, np.log(factorials)
+
+def init_matrices(home_lambdas, away_lambdas, n = 11, rho = Rho):
+    """Batch of score matrices, shape (n_events, n, n)"""
+    goals, factorials = goals_factorials(n)
+    home_lambdas = np.asarray(home_lambdas, dtype = float)[:, np.newaxis]
+    away_lambdas = np.asarray(away_lambdas, dtype = float)[:, np.newaxis]
+    home_probs = (home_lambdas ** goals) * np.exp(-home_lambdas) / factorials
+    away_probs = (away_lambdas ** goals) * np.exp(-away_lambdas) / factorials
+    return apply_dixon_coles(home_probs[:, :, np.newaxis] * away_probs[:, np.newaxis, :], home_lambdas[:, 0], away_lambdas[:, 0], rho)
+
+@lru_cache(maxsize = None)
+def match_odds_projection(n):
+    """Home win, draw and away win masks over flattened score cells, shape (n * n, 3)"""
+    i, j = np.indices((n, n))
+    return np.stack([(i > j).flatten(),
+                     (i == j).flatten(),
+                     (i < j).flatten()], axis = 1).astype(float)
+
+def batch_match_odds(matrices):
+    """Normalised [home, draw, away] probabilities, shape (n_events, 3)"""
+    n = matrices.shape[-1]
+    probs = matrices.reshape(len(matrices), n * n) @ match_odds_projection(n)
+    return probs / probs.sum(axis = 1, keepdims = True)
+
+def dixon_coles_floored(home_lambdas, away_lambdas, rho):
+    """Events with a Dixon-Coles factor floored at zero"""
+    if rho > 1:
+        return np.full(len(home_lambdas), True)
+    if rho > 0:
+        return home_lambdas * away_lambdas * rho > 1
+    return np.maximum(home_lambdas, away_lambdas) * rho < -1
+
+# maps normalised [P(home goals >= away goals), P(away goals >= home goals)] to [home, draw, away], less the constant MatchOddsOffset
+MatchOddsMap = np.array([[0, 1, -1],
+                         [-1, 1, 0]], dtype = float)
+
+MatchOddsOffset = np.array([1, -1, 1], dtype = float)
+
+def skellam_match_odds(home_lambdas, away_lambdas, rho = Rho, n = 11):
+    """batch_match_odds from the goal difference distribution, without score matrices"""
+    goals, log_factorials = goals_log_factorials(n)
+    lambdas = np.concatenate([home_lambdas, away_lambdas])[:, np.newaxis]
+    # poisson probabilities in log space, cheaper than powers; a zero lambda is a point mass at zero goals
+    probs = np.exp(goals * np.log(np.maximum(lambdas, 1e-300)) - lambdas - log_factorials).reshape(2, -1, n)
+    cdfs = np.cumsum(probs, axis = 2)
+    # p(1) * q(1) = lambda * mu * p(0) * q(0), so the Dixon-Coles corner moves rho * p(1) * q(1) from the draw to each of home and away
+    shift = rho * probs[0, :, 1] * probs[1, :, 1]
+    # P(home goals >= away goals) and P(away goals >= home goals), normalised over the truncated grid
+    unbeaten = (probs * cdfs[::-1]).sum(axis = 2) - shift
+    unbeaten /= cdfs[0, :, -1] * cdfs[1, :, -1]
+    match_odds = unbeaten.T @ MatchOddsMap + MatchOddsOffset
+    # the shift assumes no factor is floored, so events where one is are priced in full
+    if rho > 1 or rho * lambdas.max(initial = 0) < -1 or rho * (lambdas[:len(shift)] * lambdas[len(shift):]).max(initial = 0) > 1:
+        home_lambdas, away_lambdas = lambdas[:, 0].reshape(2, -1)
+        floored = dixon_coles_floored(home_lambdas, away_lambdas, rho)
+        match_odds[floored] = batch_match_odds(init_matrices(home_lambdas = home_lambdas[floored],
+                                                             away_lambdas = away_lambdas[floored],
+                                                             n = n,
+                                                             rho = rho))
+    return match_odds
+
+SurrogateStep = 0.1
+
+SurrogateLambdaMax = 9.0
+
+# maps [value(0), value(1), slope(0), slope(1)] of a cubic on [0, 1] to its power coefficients
+HermiteCoefficients = np.array([[1, 0, 0, 0],
+                                [0, 0, 1, 0],
+                                [-3, 3, -2, -1],
+                                [2, -2, 1, 1]], dtype = float)
+
+@lru_cache(maxsize = 16)
+def match_odds_grid(rho, n = 11, step = SurrogateStep, lambda_max = SurrogateLambdaMax):
+    """Grid lambdas and bicubic Hermite coefficients of unnormalised match odds, shape (n_cells, n_cells, 3, 16)"""
+    # node derivatives are exact, from d/d lambda poisson(k) = poisson(k - 1) - poisson(k); the Dixon-Coles corner is interpolated unfloored
+    lambdas = np.linspace(0, lambda_max, int(round(lambda_max / step)) + 1)
+    step = lambdas[1] - lambdas[0]
+    goals, factorials = goals_factorials(n)
+    probs = (lambdas[:, np.newaxis] ** goals) * np.exp(-lambdas[:, np.newaxis]) / factorials
+    derivatives = np.concatenate([np.zeros((len(lambdas), 1)), probs[:, :-1]], axis = 1) - probs
+    # the corner changes are rho * [[-lambda p0 * mu q0, lambda p0 * q1], [p1 * mu q0, -p1 * q1]], so each node's poisson vector is extended by [lambda p0, p1]
+    features = np.concatenate([probs, lambdas[:, np.newaxis] * probs[:, :1], probs[:, 1:2]], axis = 1)
+    derivatives = np.concatenate([derivatives, probs[:, :1] + lambdas[:, np.newaxis] * derivatives[:, :1], derivatives[:, 1:2]], axis = 1)
+    weights = np.zeros((3, n + 2, n + 2))
+    weights[:, :n, :n] = match_odds_projection(n).T.reshape(3, n, n)
+    weights[:, n:, n:] = rho * np.array([[-1, 1], [1, -1]]) * match_odds_projection(2).T.reshape(3, 2, 2)
+    def outcomes(home_probs, away_probs):
+        return home_probs @ weights @ away_probs.T
+    # node values and slopes (scaled to cell units) by [value, home slope] and [value, away slope], each shape (3, n_nodes, n_nodes)
+    nodes = [[outcomes(features, features), step * outcomes(features, derivatives)],
+             [step * outcomes(derivatives, features), step * step * outcomes(derivatives, derivatives)]]
+    # per cell 4x4 matrix of [value(0), value(1), slope(0), slope(1)] in home by the same in away
+    n_cells = len(lambdas) - 1
+    G = np.empty((3, n_cells, n_cells, 4, 4))
+    for a in range(2):
+        for b in range(2):
+            for da in range(2):
+                for db in range(2):
+                    G[:, :, :, 2 * a + da, 2 * b + db] = nodes[a][b][:, da: n_cells + da, db: n_cells + db]
+    coefficients = HermiteCoefficients @ G @ HermiteCoefficients.T
+    return lambdas, np.ascontiguousarray(coefficients.reshape(3, n_cells, n_cells, 16).transpose(1, 2, 0, 3))
+
+def surrogate_match_odds(home_lambdas, away_lambdas, rho = Rho, n = 11, step = SurrogateStep, lambda_max = SurrogateLambdaMax):
+    """batch_match_odds interpolated from match_odds_grid(rho), to within ~1e-6 at the default step"""
+    lambdas, coefficients = match_odds_grid(rho, n, step, lambda_max)
+    n_cells = len(lambdas) - 1
+    home_lambdas = np.asarray(home_lambdas, dtype = float)
+    away_lambdas = np.asarray(away_lambdas, dtype = float)
+    positions = np.array([home_lambdas, away_lambdas]) * (n_cells / lambdas[-1])
+    if len(positions[0]) == 0:
+        return np.zeros((0, 3))
+    cells = np.minimum(np.abs(positions).astype(int), n_cells - 1)
+    powers = (positions - cells)[:, :, np.newaxis] ** np.arange(4)
+    probs = (coefficients[cells[0], cells[1]] @ (powers[0][:, :, np.newaxis] * powers[1][:, np.newaxis, :]).reshape(-1, 16, 1))[:, :, 0]
+    match_odds = probs / probs.sum(axis = 1, keepdims = True)
+    # events off the grid, or whose Dixon-Coles factors are floored at zero, are priced in full
+    outside = ((positions.min(axis = 0) < 0) | (positions.max(axis = 0) > n_cells) |
+               dixon_coles_floored(home_lambdas, away_lambdas, rho))
+    if outside.any():
+        match_odds[outside] = batch_match_odds(init_matrices(home_lambdas = home_lambdas[outside],
+                                                             away_lambdas = away_lambdas[outside],
+                                                             n = n,
+                                                             rho = rho))
+    return match_odds
+
+@lru_cache(maxsize = None)
+def goals_projection(n, key):
+    """One-hot map from flattened score cells to goal totals or goal differences"""
+    i, j = np.indices((n, n))
+    values = (i + j) if key == "total" else (i - j)
+    offset = -values.min()
+    projection = np.zeros((n * n, values.max() + offset + 1))
+    projection[np.arange(n * n), values.flatten() + offset] = 1
+    return projection, offset
+
+def goals_distributions(matrices, key):
+    n = matrices.shape[-1]
+    projection, offset = goals_projection(n, key)
+    return matrices.reshape(len(matrices), n * n) @ projection, offset
+
+def split_lines(lines):
+    """Quarter and three quarter lines are split into their two neighbouring half/integer lines"""
+    lines = np.asarray(lines, dtype = float)
+    quarter = np.isclose((lines * 2) % 1, 0.5)
+    return (np.where(quarter, lines - 0.25, lines),
+            np.where(quarter, lines + 0.25, lines))
+
+def line_probabilities(distributions, offset, lines):
+    """[P(X > line), P(X < line)] per event, with integer line pushes excluded and quarter line halves averaged"""
+    cdf = np.cumsum(distributions, axis = 1)
+    rows, last = np.arange(len(cdf)), cdf.shape[1] - 1
+    halves = []
+    for sublines in split_lines(lines):
+        lower = np.ceil(sublines).astype(int) - 1 + offset
+        upper = np.floor(sublines).astype(int) + offset
+        under = np.where(lower < 0, 0, cdf[rows, np.clip(lower, 0, last)])
+        over = cdf[:, last] - np.where(upper < 0, 0, cdf[rows, np.clip(upper, 0, last)])
+        halves.append(np.stack([over, under], axis = 1) / (over + under)[:, np.newaxis])
+    return (halves[0] + halves[1]) / 2
+
+def batch_over_under(matrices, lines):
+    """[over, under] probabilities for total goals lines, shape (n_events, 2)"""
+    distributions, offset = goals_distributions(matrices, "total")
+    return line_probabilities(distributions, offset, lines)
+
+def batch_asian_handicap(matrices, lines):
+    """[home, away] probabilities for home team handicap lines, shape (n_events, 2)"""
+    distributions, offset = goals_distributions(matrices, "difference")
+    return line_probabilities(distributions, offset, -np.asarray(lines, dtype = float))
 
 class ScoreMatrix:
 
     @classmethod
-    def initialise(self, event_name, ratings, home_advantage, n = 11, rho = 0.1):
+    def initialise(self, event_name, ratings, home_advantage, n = 11, rho = Rho):
         home_team_name, away_team_name = event_name.split(" vs ")
         home_lambda = ratings[home_team_name] * home_advantage
         away_lambda = ratings[away_team_name]
@@ -39,22 +228,22 @@ class ScoreMatrix:
         self.matrix = self.init_matrix(n)
 
     def init_matrix(self, n):
-        home_goals = np.arange(n)
-        away_goals = np.arange(n)
-        home_probs = poisson_prob(self.home_lambda, home_goals[:, np.newaxis])
-        away_probs = poisson_prob(self.away_lambda, away_goals[np.newaxis, :])
-        dixon_coles_matrix = np.vectorize(dixon_coles_adjustment)(home_goals[:, np.newaxis], away_goals[np.newaxis, :], self.rho)
-        return home_probs * away_probs * dixon_coles_matrix
+        return init_matrices(home_lambdas = [self.home_lambda],
+                             away_lambdas = [self.away_lambda],
+                             n = n,
+                             rho = self.rho)[0]
 
     @property
     def n(self):
         return len(self.matrix)
     
-    def simulate_scores(self, n_paths):
+    def simulate_scores(self, n_paths, rng = None):
+        if rng is None:
+            rng = np.random.default_rng()
         flat_matrix = self.matrix.flatten() 
-        chosen_indices = np.random.choice(len(flat_matrix),
-                                          size=n_paths,
-                                          p=flat_matrix / flat_matrix.sum())
+        chosen_indices = rng.choice(len(flat_matrix),
+                                    size=n_paths,
+                                    p=flat_matrix / flat_matrix.sum())
         indexes = [(i, j)
                    for i in range(self.matrix.shape[0])
                    for j in range(self.matrix.shape[1])]
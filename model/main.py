@@ -1,8 +1,11 @@
-from model.kernel import ScoreMatrix
+from model.kernel import ScoreMatrix, Rho
 from model.markets import init_markets
-from model.solver import RatingsSolver
-from model.simulator import SimPoints
-from model.state import calc_league_table, calc_remaining_fixtures
+from model.rng import spawn_seeds
+from model.solver import RatingsSolver, MatchOdds, BootstrapIterations, BootstrapTolerance
+from model.simulator import SimPoints, SimPointsPool
+from model.state import calc_league_table, calc_season_fixtures
+
+import numpy as np
 
 def mean(X):
     return sum(X) / len(X) if X != [] else 0
@@ -38,14 +41,15 @@ class Event(dict):
         match_odds = self.match_odds
         return 3 * match_odds[2] + match_odds[1]
 
-def calc_training_errors(team_names, events, ratings, home_advantage):
+def calc_training_errors(team_names, events, ratings, home_advantage, rho = Rho):
     errors = {team_name: [] for team_name in team_names}
     for event in events:
 
         home_team_name, away_team_name = event["name"].split(" vs ")
         matrix = ScoreMatrix.initialise(event_name = event["name"],
                                         ratings = ratings,
-                                        home_advantage = home_advantage)
+                                        home_advantage = home_advantage,
+                                        rho = rho)
         event = Event(event)
         home_team_err = matrix.expected_home_points - event.expected_home_points
         away_team_err = matrix.expected_away_points - event.expected_away_points
@@ -53,7 +57,7 @@ def calc_training_errors(team_names, events, ratings, home_advantage):
         errors[away_team_name].append(away_team_err)
     return errors
 
-def calc_points_per_game_ratings(team_names, ratings, home_advantage):
+def calc_points_per_game_ratings(team_names, ratings, home_advantage, rho = Rho):
     ppg_ratings = {team_name: 0 for team_name in team_names}
     for home_team_name in team_names:
         for away_team_name in team_names:
@@ -61,27 +65,14 @@ def calc_points_per_game_ratings(team_names, ratings, home_advantage):
                 event_name = f"{home_team_name} vs {away_team_name}"
                 matrix = ScoreMatrix.initialise(event_name = event_name,
                                                 ratings = ratings,
-                                                home_advantage = home_advantage)
+                                                home_advantage = home_advantage,
+                                                rho = rho)
                 ppg_ratings[home_team_name] += matrix.expected_home_points
                 ppg_ratings[away_team_name] += matrix.expected_away_points
     n_games = (len(team_names) - 1) * 2
     return {team_name:ppg_value / n_games
             for team_name, ppg_value in ppg_ratings.items()}
 
-def calc_expected_season_points(team_names, events, handicaps, remaining_fixtures, ratings, home_advantage):
-    exp_points = {team["name"]: team["points"]
-                  for team in calc_league_table(team_names = team_names,
-                                                events = events,
-                                                handicaps = handicaps)}
-    for event_name in remaining_fixtures:
-        home_team_name, away_team_name = event_name.split(" vs ")
-        matrix = ScoreMatrix.initialise(event_name = event_name,
-                                        ratings = ratings,
-                                        home_advantage = home_advantage)
-        exp_points[home_team_name] += matrix.expected_home_points
-        exp_points[away_team_name] += matrix.expected_away_points
-    return exp_points                                  
-
 def calc_position_probabilities(sim_points, markets):
     position_probs = {"default": sim_points.position_probabilities()}
     for market in markets:
@@ -90,10 +81,15 @@ def calc_position_probabilities(sim_points, markets):
             position_probs[market["name"]] = sim_points.position_probabilities(team_names = market["teams"])
     return position_probs
 
+def calc_playoff_probabilities(sim_points, markets):
+    return {market["name"]: sim_points.playoff_probabilities(positions = market["playoff"]["positions"])
+            for market in markets
+            if "playoff" in market}
+
 def sum_product(X, Y):
     return sum([x*y for x, y in zip(X, Y)])
 
-def calc_outright_marks(position_probabilities, markets):
+def calc_outright_marks(position_probabilities, markets, playoff_probabilities = {}):
     marks = []
     for market in markets:
         group_pp_key = market["name"] if ("include" in market or "exclude" in market) else "default"
@@ -101,14 +97,326 @@ def calc_outright_marks(position_probabilities, markets):
         for team_name in market["teams"]:
             mark_value = sum_product(group_pp_matrix[team_name],
                                      market["payoff"])
+            if "playoff" in market:
+                mark_value += market["playoff"]["payoff"] * playoff_probabilities[market["name"]][team_name]
             mark = {"market": market["name"],
                     "team": team_name,
                     "mark": mark_value}
             marks.append(mark)
     return marks
 
+def memoise(fn):
+    def wrapped(self):
+        if fn.__name__ not in self.stages:
+            self.stages[fn.__name__] = fn(self)
+        return self.stages[fn.__name__]
+    return wrapped
+
+class SimulationResult:
+    """Outputs computed on first lookup and memoised, as are the stages they share"""
+
+    Outputs = ["teams",
+               "outright_marks",
+               "home_advantage",
+               "rho",
+               "solver_error",
+               "ratings",
+               "position_probabilities",
+               "playoff_probabilities",
+               "training_errors",
+               "expected_season_points",
+               "points_distributions",
+               "points_per_game_ratings",
+               "outright_sensitivities",
+               "rating_deviations"]
+
+    def __init__(self, ratings, training_set, rho, solver_options, n_paths, events, handicaps, markets, rounds, split, seed, backend, sensitivities = False, bootstrap = None, n_workers = None, points_bands = []):
+        self.outputs = {}
+        self.stages = {}
+        self.initial_ratings = ratings
+        self.training_set = training_set
+        self.initial_rho = rho
+        self.solver_options = solver_options
+        self.n_paths = n_paths
+        self.events = events
+        self.handicaps = handicaps
+        self.markets = markets
+        self.rounds = rounds
+        self.split = split
+        self.backend = backend
+        self.sensitivities = sensitivities
+        self.bootstrap = bootstrap
+        self.n_workers = n_workers
+        self.points_bands = points_bands
+        self.solver_seed, self.simulation_seed, self.bootstrap_seed, self.convergence_seed = spawn_seeds(seed, 4)
+        self.team_names = sorted(list(ratings.keys()))
+        init_markets(self.team_names, markets)
+
+    def __getitem__(self, key):
+        if key not in self.Outputs:
+            raise KeyError(key)
+        if key not in self.outputs:
+            self.outputs[key] = getattr(self, key)
+        return self.outputs[key]
+
+    ### stages
+
+    @property
+    @memoise
+    def league_table(self):
+        return calc_league_table(team_names = self.team_names,
+                                 events = self.events,
+                                 handicaps = self.handicaps)
+
+    @property
+    @memoise
+    def season_fixtures(self):
+        return calc_season_fixtures(team_names = self.team_names,
+                                    events = self.events,
+                                    handicaps = self.handicaps,
+                                    rounds = self.rounds,
+                                    split = self.split)
+
+    @property
+    def split_halves(self):
+        """Halves fixed by the actual table once the split has happened, otherwise None"""
+        return self.season_fixtures[0]
+
+    @property
+    def remaining_fixtures(self):
+        return self.season_fixtures[1]
+
+    @property
+    def split_fixtures(self):
+        return self.season_fixtures[2]
+
+    @property
+    @memoise
+    def solver_resp(self):
+        solver = RatingsSolver()
+        solution = solver.solve(ratings = self.initial_ratings,
+                                events = self.training_set,
+                                rho = self.initial_rho,
+                                backend = self.backend,
+                                seed = self.solver_seed,
+                                results = self.events,
+                                **self.solver_options)
+        if not self.bootstrap:
+            return solution
+        # the ensemble is centred on this solution, so it is converged to the replicates' standard
+        return solver.converge(events = self.training_set,
+                               solution = solution,
+                               seed = self.convergence_seed,
+                               **self.bootstrap_options)
+
+    @property
+    def bootstrap_options(self):
+        solver_options = {key: value for key, value in self.solver_options.items()
+                          if key not in ["max_iterations", "optimiser", "init_std", "excellent_error"]}
+        return dict(solver_options,
+                    max_iterations = self.bootstrap.get("max_iterations", BootstrapIterations),
+                    tolerance = self.bootstrap.get("tolerance", BootstrapTolerance),
+                    rho = self.initial_rho,
+                    backend = self.backend)
+
+    @property
+    @memoise
+    def ensemble(self):
+        if not self.bootstrap:
+            return None
+        solver = RatingsSolver()
+        return solver.bootstrap(events = self.training_set,
+                                solution = self.solver_resp,
+                                n_replicates = self.bootstrap["replicates"],
+                                n_workers = self.bootstrap.get("workers"),
+                                seed = self.bootstrap_seed,
+                                converged = True,
+                                **self.bootstrap_options)
+
+    @property
+    @memoise
+    def playoffs(self):
+        """Distinct playoff positions across markets"""
+        playoffs = []
+        for market in self.markets:
+            if "playoff" in market and market["playoff"]["positions"] not in playoffs:
+                playoffs.append(market["playoff"]["positions"])
+        return playoffs
+
+    @property
+    @memoise
+    def sim_points(self):
+        # with an ensemble, chunks are sized so that every replicate simulates a block of paths
+        chunk_size = (min(SimPoints.ChunkSize, -(-self.n_paths // self.bootstrap["replicates"]))
+                      if self.bootstrap else SimPoints.ChunkSize)
+        # sensitivities need every path's score weights, so are only tracked in process
+        if self.n_workers and not self.sensitivities:
+            sim_points = SimPointsPool(self.league_table, self.n_paths,
+                                       seed = self.simulation_seed,
+                                       chunk_size = chunk_size,
+                                       backend = self.backend,
+                                       n_workers = self.n_workers)
+            sim_points.simulate(event_names = self.remaining_fixtures,
+                                ratings = self.ratings,
+                                home_advantage = self.home_advantage,
+                                rho = self.rho,
+                                split_fixtures = self.split_fixtures,
+                                split_size = self.split["size"] if self.split else None,
+                                ensemble = self.ensemble,
+                                groups = [None] + [market["teams"] for market in self.markets
+                                                   if "include" in market or "exclude" in market],
+                                playoffs = self.playoffs)
+            return sim_points
+        sim_points = SimPoints(self.league_table, self.n_paths,
+                               seed = self.simulation_seed,
+                               chunk_size = chunk_size,
+                               backend = self.backend,
+                               sensitivities = self.sensitivities)
+        sim_points.simulate_fixtures(event_names = self.remaining_fixtures,
+                                     ratings = self.ratings,
+                                     home_advantage = self.home_advantage,
+                                     rho = self.rho,
+                                     ensemble = self.ensemble)
+        if self.split_fixtures:
+            sim_points.simulate_split(event_names = self.split_fixtures,
+                                      ratings = self.ratings,
+                                      home_advantage = self.home_advantage,
+                                      rho = self.rho,
+                                      split_size = self.split["size"],
+                                      ensemble = self.ensemble)
+        for positions in self.playoffs:
+            sim_points.simulate_playoff(positions = positions,
+                                        ratings = self.ratings,
+                                        home_advantage = self.home_advantage,
+                                        rho = self.rho,
+                                        ensemble = self.ensemble)
+        return sim_points
+
+    ### outputs
+
+    @property
+    @memoise
+    def ratings(self):
+        return self.solver_resp["ratings"]
+
+    @property
+    @memoise
+    def home_advantage(self):
+        return self.solver_resp["home_advantage"]
+
+    @property
+    @memoise
+    def rho(self):
+        return self.solver_resp["rho"]
+
+    @property
+    @memoise
+    def solver_error(self):
+        return self.solver_resp["error"]
+
+    @property
+    @memoise
+    def position_probabilities(self):
+        return calc_position_probabilities(sim_points = self.sim_points,
+                                           markets = self.markets)
+
+    @property
+    @memoise
+    def playoff_probabilities(self):
+        """Probability of each team winning each playoff market's playoff, by market name"""
+        return calc_playoff_probabilities(sim_points = self.sim_points,
+                                          markets = self.markets)
+
+    @property
+    @memoise
+    def training_errors(self):
+        return calc_training_errors(team_names = self.team_names,
+                                    events = self.training_set,
+                                    ratings = self.ratings,
+                                    home_advantage = self.home_advantage,
+                                    rho = self.rho)
+
+    @property
+    @memoise
+    def points_distributions(self):
+        """Mean, quantiles and points_bands probabilities of each team's simulated final points"""
+        return self.sim_points.points_distributions(bands = self.points_bands)
+
+    @property
+    @memoise
+    def expected_season_points(self):
+        return {team_name: distribution["mean"]
+                for team_name, distribution in self.points_distributions.items()}
+
+    @property
+    @memoise
+    def points_per_game_ratings(self):
+        return calc_points_per_game_ratings(team_names = self.team_names,
+                                            ratings = self.ratings,
+                                            home_advantage = self.home_advantage,
+                                            rho = self.rho)
+
+    @property
+    @memoise
+    def teams(self):
+        teams = []
+        for team in self.league_table:
+            errors = self.training_errors[team["name"]]
+            teams.append(dict(team, **{"training_events": len(errors),
+                                       "mean_training_error": mean(errors),
+                                       "std_training_error": std_deviation(errors),
+                                       "poisson_rating": self.ratings[team["name"]],
+                                       "points_per_game_rating": self.points_per_game_ratings[team["name"]],
+                                       "expected_season_points": self.expected_season_points[team["name"]],
+                                       "position_probabilities": self.position_probabilities["default"][team["name"]]}))
+        return teams
+
+    @property
+    @memoise
+    def outright_marks(self):
+        return calc_outright_marks(position_probabilities = self.position_probabilities,
+                                   markets = self.markets,
+                                   playoff_probabilities = self.playoff_probabilities)
+
+    @property
+    @memoise
+    def outright_sensitivities(self):
+        """Each outright mark with its likelihood-ratio gradients to every rating and home advantage"""
+        if self.playoffs != []:
+            raise RuntimeError("outright_sensitivities do not cover playoff markets")
+        if not self.sensitivities:
+            # re-simulating from the same seed reproduces the same paths, now with score weights
+            self.sensitivities = True
+            self.stages.pop("sim_points", None)
+        sensitivities = []
+        for market in self.markets:
+            team_names = market["teams"] if ("include" in market or "exclude" in market) else None
+            market_sensitivities = self.sim_points.mark_sensitivities(payoff = market["payoff"],
+                                                                      team_names = team_names)
+            for team_name in market["teams"]:
+                sensitivities.append(dict({"market": market["name"],
+                                           "team": team_name},
+                                          **market_sensitivities[team_name]))
+        return sensitivities
+
+    @property
+    @memoise
+    def rating_deviations(self):
+        """Standard deviation of each team's rating across bootstrap replicates"""
+        if not self.bootstrap:
+            raise RuntimeError("rating_deviations requires bootstrap")
+        return {team_name: float(np.std([solution["ratings"][team_name] for solution in self.ensemble]))
+                for team_name in self.team_names}
+
+DefaultOutputs = ["teams",
+                  "outright_marks",
+                  "home_advantage",
+                  "rho",
+                  "solver_error"]
+
 def simulate(ratings,
              training_set,
+             rho = Rho,
              max_iterations = 500,
              population_size = 8,
              mutation_factor = 0.1,
@@ -119,75 +427,70 @@ def simulate(ratings,
              mutation_probability = 0.3,
              exploration_interval = 50,
              n_exploration_points = 10,
+             differential_weight = 0.8,
+             crossover_probability = 0.9,
              excellent_error = 0.03,
              max_error = 0.05,
+             fit_markets = [MatchOdds],
+             optimiser = "genetic",
+             surrogate = False,
              n_paths = 1000,
              events = [],
              handicaps = {},
              markets = [],
-             rounds = 1):
-    team_names = sorted(list(ratings.keys()))
-    init_markets(team_names, markets)
-    league_table = calc_league_table(team_names = team_names,
-                                     events = events,
-                                     handicaps = handicaps)
-    remaining_fixtures = calc_remaining_fixtures(team_names = team_names,
-                                                 events = events,
-                                                 rounds = rounds)
-    solver = RatingsSolver()
-    solver_resp = solver.solve(ratings = ratings,
-                               events = training_set,
-                               max_iterations = max_iterations,
-                               population_size = population_size,
-                               mutation_factor = mutation_factor,
-                               elite_ratio = elite_ratio,
-                               init_std = init_std,
-                               log_interval = log_interval,
-                               decay_exponent = decay_exponent,
-                               mutation_probability = mutation_probability,
-                               exploration_interval = exploration_interval,
-                               n_exploration_points = n_exploration_points,
-                               excellent_error = excellent_error,
-                               max_error = max_error,
-                               results = events)
-    poisson_ratings = solver_resp["ratings"]
-    home_advantage = solver_resp["home_advantage"]
-    solver_error = solver_resp["error"]
-    sim_points = SimPoints(league_table, n_paths)
-    for event_name in remaining_fixtures:
-        sim_points.simulate(event_name = event_name,
-                            ratings = poisson_ratings,
-                            home_advantage = home_advantage)
-    position_probs = calc_position_probabilities(sim_points = sim_points,
-                                                 markets = markets)
-    training_errors = calc_training_errors(team_names = team_names,
-                                           events = training_set,
-                                           ratings = poisson_ratings,
-                                           home_advantage = home_advantage)
-    season_points = calc_expected_season_points(team_names = team_names,
-                                                events = events,
-                                                handicaps = handicaps,
-                                                remaining_fixtures = remaining_fixtures,
-                                                ratings = poisson_ratings,
-                                                home_advantage = home_advantage)
-    ppg_ratings = calc_points_per_game_ratings(team_names = team_names,
-                                               ratings = poisson_ratings,
-                                               home_advantage = home_advantage)
-    for team in league_table:
-        errors = training_errors[team["name"]]
-        team.update({"training_events": len(errors),
-                     "mean_training_error": mean(errors),
-                     "std_training_error": std_deviation(errors),
-                     "poisson_rating": poisson_ratings[team["name"]],
-                     "points_per_game_rating": ppg_ratings[team["name"]],
-                     "expected_season_points": season_points[team["name"]],
-                     "position_probabilities": position_probs["default"][team["name"]]})
-    outright_marks = calc_outright_marks(position_probabilities = position_probs,
-                                         markets = markets)        
-    return {"teams": league_table,
-            "outright_marks": outright_marks,
-            "home_advantage": home_advantage,
-            "solver_error": solver_error}
+             rounds = 1,
+             split = None,
+             seed = None,
+             backend = "numpy",
+             bootstrap = None,
+             n_workers = None,
+             points_bands = [],
+             outputs = None,
+             lazy = False):
+    """Dict of the named outputs, or with lazy the SimulationResult that computes outputs on demand"""
+    # bootstrap, eg {"replicates": 8, "max_iterations": 500, "tolerance": 1e-3, "workers": None}, carries rating uncertainty into marks
+    # a market's playoff, eg {"positions": [3, 4, 5, 6], "payoff": 1}, pays its winner on top of the position payoff
+    # points_bands, eg [[None, 39], [40, 59], [60, None]], are inclusive final points ranges
+    if outputs is None:
+        outputs = [] if lazy else DefaultOutputs
+    unknown = [output for output in outputs
+               if output not in SimulationResult.Outputs]
+    if unknown != []:
+        raise RuntimeError("unknown outputs %s" % ", ".join(unknown))
+    result = SimulationResult(ratings = ratings,
+                              training_set = training_set,
+                              rho = rho,
+                              solver_options = {"max_iterations": max_iterations,
+                                                "population_size": population_size,
+                                                "mutation_factor": mutation_factor,
+                                                "elite_ratio": elite_ratio,
+                                                "init_std": init_std,
+                                                "log_interval": log_interval,
+                                                "decay_exponent": decay_exponent,
+                                                "mutation_probability": mutation_probability,
+                                                "exploration_interval": exploration_interval,
+                                                "n_exploration_points": n_exploration_points,
+                                                "differential_weight": differential_weight,
+                                                "crossover_probability": crossover_probability,
+                                                "excellent_error": excellent_error,
+                                                "max_error": max_error,
+                                                "fit_markets": fit_markets,
+                                                "optimiser": optimiser,
+                                                "surrogate": surrogate},
+                              n_paths = n_paths,
+                              events = events,
+                              handicaps = handicaps,
+                              markets = markets,
+                              rounds = rounds,
+                              split = split,
+                              seed = seed,
+                              backend = backend,
+                              sensitivities = "outright_sensitivities" in outputs,
+                              bootstrap = bootstrap,
+                              n_workers = n_workers,
+                              points_bands = points_bands)
+    resp = {output: result[output] for output in outputs}
+    return result if lazy else resp
 
 if __name__=="__main__":
     pass
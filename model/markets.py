@@ -40,8 +40,22 @@ def init_exclude_market(team_names, market):
 def init_market(team_names, market):
     market["teams"] = team_names
         
+def init_playoff(team_names, market):
+    """A playoff, eg {"positions": [3, 4, 5, 6], "payoff": 1}, pays its winner on top of the position payoff"""
+    # playoff positions are league-wide, so cannot be combined with include or exclude
+    playoff = market["playoff"]
+    if "include" in market or "exclude" in market:
+        raise RuntimeError("%s playoff market cannot include or exclude teams" % market["name"])
+    if (len(set(playoff["positions"])) != 4 or
+        len(playoff["positions"]) != 4 or
+        any(position < 1 or position > len(team_names) for position in playoff["positions"])):
+        raise RuntimeError("%s playoff needs four distinct positions between 1 and %i" % (market["name"], len(team_names)))
+    playoff.setdefault("payoff", 1)
+
 def init_markets(team_names, markets):
     for market in markets:
+        if "playoff" in market:
+            init_playoff(team_names, market)
         if "include" in market:
             init_include_market(team_names, market)
         elif "exclude" in market:
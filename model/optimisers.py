@@ -0,0 +1,300 @@
+from model.rng import init_rng
+import numpy as np
+import logging
+
+class OptimizationResult:
+    def __init__(self, x, fun, success=True, n_evaluations=0, evaluations_to_target=None):
+        self.x = x
+        self.fun = fun
+        self.success = success
+        self.n_evaluations = n_evaluations
+        self.evaluations_to_target = evaluations_to_target
+
+class Convergence:
+    """Best solution, objective call count and evaluations-to-target, shared by all optimiser backends"""
+
+    def __init__(self, objective, options):
+        self.objective = objective
+        self.options = options
+        self.logger = logging.getLogger(__name__)
+        self.n_evaluations = 0
+        self.evaluations_to_target = None
+        self.best_fitness = float('inf')
+        self.best_solution = None
+
+    def record(self, individual, fitness):
+        self.n_evaluations += 1
+        if fitness < self.best_fitness:
+            self.best_fitness = fitness
+            self.best_solution = np.array(individual, dtype=float).copy()
+        if (self.evaluations_to_target is None and
+            fitness <= self.options.get('excellent_error')):
+            self.evaluations_to_target = self.n_evaluations
+        return fitness
+
+    def evaluate(self, population):
+        return np.array([self.record(individual, self.objective(individual))
+                         for individual in population])
+
+    def evaluate_incremental(self, population, parents):
+        """Evaluates each individual from its parent's (params, state), if the objective supports it"""
+        if not hasattr(self.objective, 'evaluate'):
+            return self.evaluate(population), [None] * len(population)
+        fitness_scores, states = [], []
+        for individual, parent in zip(population, parents):
+            fitness, state = self.objective.evaluate(individual, parent)
+            fitness_scores.append(self.record(individual, fitness))
+            states.append(state)
+        return np.array(fitness_scores), states
+
+    def log(self, generation, fitness_scores, message=""):
+        max_iter = self.options.get('maxiter')
+        log_interval = self.options.get('log_interval')
+        if generation % log_interval == 0 or generation == max_iter - 1:
+            self.logger.info(f"Generation {generation + 1}/{max_iter}: best={self.best_fitness:.6f}, avg={np.mean(fitness_scores):.6f}{message}")
+
+    def converged(self, generation):
+        max_iter = self.options.get('maxiter')
+        excellent_error = self.options.get('excellent_error')
+        max_error = self.options.get('max_error')
+        if self.best_fitness <= excellent_error:
+            self.logger.info(f"Excellent result achieved at generation {generation + 1}: error {self.best_fitness:.6f} ≤ {excellent_error}")
+            return True
+        if self.best_fitness > max_error and generation == max_iter - 1:
+            self.logger.warning(f"Max generations reached with error {self.best_fitness:.6f} > {max_error}")
+        return False
+
+    def result(self):
+        self.logger.info(f"Optimization completed after {self.n_evaluations} evaluations. Final objective value: {self.best_fitness:.6f}")
+        return OptimizationResult(self.best_solution,
+                                  self.best_fitness,
+                                  n_evaluations=self.n_evaluations,
+                                  evaluations_to_target=self.evaluations_to_target)
+
+def clip_to_bounds(population, bounds):
+    if not bounds:
+        return population
+    low, high = np.array(bounds, dtype=float).T
+    return np.clip(population, low, high)
+
+def init_population(x0, bounds, options, rng):
+    """x0 plus candidates drawn uniformly within bounds (or around x0 if unbounded)"""
+    population_size = options.get('population_size')
+    population = [np.array(x0, dtype=float)]
+    for _ in range(population_size - 1):
+        if bounds:
+            candidate = np.array([rng.uniform(low, high) for low, high in bounds])
+        else:
+            init_std = options.get('init_std')
+            candidate = np.array(x0) + rng.normal(0, init_std, len(x0))
+        population.append(candidate)
+    return np.array(population)
+
+def minimize_genetic(objective, x0, bounds=None, options=None, seed=None):
+    """Parallel genetic algorithm with population-based optimization"""
+    if options is None:
+        options = {}
+    rng = init_rng(seed)
+    convergence = Convergence(objective, options)
+
+    max_iter = options.get('maxiter')
+    population_size = options.get('population_size')
+    mutation_factor = options.get('mutation_factor')
+    elite_ratio = options.get('elite_ratio')
+    exploration_interval = options.get('exploration_interval')
+    n_exploration_points = options.get('n_exploration_points')
+    logger = logging.getLogger(__name__)
+
+    n_params = len(x0)
+    n_elite = max(1, int(population_size * elite_ratio))
+
+    logger.info(f"Starting parallel genetic algorithm: {max_iter} generations, {population_size} candidates per generation")
+
+    # Initialize population - shape: (population_size, n_params); first candidate is the league table-sorted initial guess (x0)
+    population = init_population(x0, bounds, options, rng)
+    fitness_scores, states = convergence.evaluate_incremental(population, [None] * population_size)
+
+    for generation in range(max_iter):
+        # Log progress
+        time_remaining = (max_iter - generation) / max_iter
+        current_mutation = mutation_factor * (time_remaining ** 0.5)
+        convergence.log(generation, fitness_scores, f", mutation={current_mutation:.4f}")
+
+        # Check convergence
+        if convergence.converged(generation):
+            break
+
+        # Selection: keep elite performers
+        elite_indices = np.argsort(fitness_scores)[:n_elite]
+        elite_population = population[elite_indices]
+        elite_states = [states[i] for i in elite_indices]
+
+        # Generate new population, recording each offspring's parent so incremental objectives can reuse its state
+        new_population, parents = [], []
+
+        # Keep elite unchanged
+        for i in range(n_elite):
+            new_population.append(elite_population[i].copy())
+
+        # Calculate decay factor for this generation
+        time_remaining = (max_iter - generation) / max_iter  # Goes from 1.0 to 0.0
+        decay_exponent = options.get('decay_exponent')
+        decay_factor = time_remaining ** decay_exponent
+        current_mutation_factor = mutation_factor * decay_factor
+
+        # Generate offspring from elite
+        while len(new_population) < population_size:
+            # Select random elite parent
+            parent_idx = rng.integers(0, n_elite)
+            parent = elite_population[parent_idx].copy()
+
+            # Apply mutations with decay
+            mutation_probability = options.get('mutation_probability')
+            for i in range(n_params):
+                if rng.random() < mutation_probability:
+                    mutation = rng.normal(0, current_mutation_factor)
+                    parent[i] += mutation
+
+                    # Clamp to bounds
+                    if bounds and bounds[i]:
+                        low, high = bounds[i]
+                        parent[i] = max(low, min(high, parent[i]))
+
+            new_population.append(parent)
+            parents.append((elite_population[parent_idx], elite_states[parent_idx]))
+
+        # Periodically replace the last offspring with fresh points drawn within bounds
+        if (bounds and exploration_interval and
+            generation > 0 and generation % exploration_interval == 0):
+            n_explore = min(n_exploration_points, population_size - n_elite)
+            for i in range(population_size - n_explore, population_size):
+                new_population[i] = np.array([rng.uniform(low, high) for low, high in bounds])
+                parents[i - n_elite] = None
+
+        population = np.array(new_population)
+
+        # Elites are carried over unchanged so only offspring need evaluating
+        offspring_scores, offspring_states = convergence.evaluate_incremental(population[n_elite:], parents)
+        fitness_scores = np.concatenate([fitness_scores[elite_indices], offspring_scores])
+        states = elite_states + offspring_states
+
+    return convergence.result()
+
+def minimize_differential_evolution(objective, x0, bounds=None, options=None, seed=None):
+    """Differential evolution (rand/1/bin) with greedy one-to-one selection"""
+    if options is None:
+        options = {}
+    rng = init_rng(seed)
+    convergence = Convergence(objective, options)
+
+    max_iter = options.get('maxiter')
+    differential_weight = options.get('differential_weight')
+    crossover_probability = options.get('crossover_probability')
+    logger = logging.getLogger(__name__)
+
+    population = init_population(x0, bounds, {**options,
+                                              'population_size': max(4, options.get('population_size'))}, rng)
+    population_size, n_params = population.shape
+
+    logger.info(f"Starting differential evolution: {max_iter} generations, {population_size} candidates per generation")
+
+    fitness_scores = convergence.evaluate(population)
+
+    for generation in range(max_iter):
+        convergence.log(generation, fitness_scores)
+
+        if convergence.converged(generation):
+            break
+
+        # Mutation: three distinct donors per target, none equal to the target itself
+        donors = np.array([rng.choice([j for j in range(population_size) if j != i], 3, replace=False)
+                           for i in range(population_size)])
+        mutants = population[donors[:, 0]] + differential_weight * (population[donors[:, 1]] - population[donors[:, 2]])
+
+        # Binomial crossover, forcing at least one parameter from the mutant
+        crossover = rng.random((population_size, n_params)) < crossover_probability
+        crossover[np.arange(population_size), rng.integers(0, n_params, population_size)] = True
+        trials = clip_to_bounds(np.where(crossover, mutants, population), bounds)
+
+        trial_scores = convergence.evaluate(trials)
+        improved = trial_scores <= fitness_scores
+        population[improved] = trials[improved]
+        fitness_scores[improved] = trial_scores[improved]
+
+    return convergence.result()
+
+def minimize_cma_es(objective, x0, bounds=None, options=None, seed=None):
+    """(mu/mu_w, lambda) CMA-ES started at x0 with step size init_std, clipping samples to bounds"""
+    if options is None:
+        options = {}
+    rng = init_rng(seed)
+    convergence = Convergence(objective, options)
+
+    max_iter = options.get('maxiter')
+    sigma = options.get('init_std')
+    logger = logging.getLogger(__name__)
+
+    mean = np.array(x0, dtype=float)
+    n_params = len(mean)
+    population_size = max(4, options.get('population_size'))
+    mu = population_size // 2
+    weights = np.log(mu + 0.5) - np.log(np.arange(1, mu + 1))
+    weights /= weights.sum()
+    mueff = 1 / np.sum(weights ** 2)
+
+    # Strategy parameters, per Hansen's tutorial defaults
+    cc = (4 + mueff / n_params) / (n_params + 4 + 2 * mueff / n_params)
+    cs = (mueff + 2) / (n_params + mueff + 5)
+    c1 = 2 / ((n_params + 1.3) ** 2 + mueff)
+    cmu = min(1 - c1, 2 * (mueff - 2 + 1 / mueff) / ((n_params + 2) ** 2 + mueff))
+    damps = 1 + 2 * max(0, np.sqrt((mueff - 1) / (n_params + 1)) - 1) + cs
+    chi_n = np.sqrt(n_params) * (1 - 1 / (4 * n_params) + 1 / (21 * n_params ** 2))
+
+    pc, ps = np.zeros(n_params), np.zeros(n_params)
+    B, D, C = np.eye(n_params), np.ones(n_params), np.eye(n_params)
+
+    logger.info(f"Starting CMA-ES: {max_iter} generations, {population_size} candidates per generation")
+
+    for generation in range(max_iter):
+        z = rng.standard_normal((population_size, n_params))
+        population = clip_to_bounds(mean + sigma * (z * D) @ B.T, bounds)
+        fitness_scores = convergence.evaluate(population)
+        convergence.log(generation, fitness_scores, f", sigma={sigma:.4f}")
+
+        if convergence.converged(generation):
+            break
+
+        # Recombination over the mu best, using the (repaired) steps actually evaluated
+        steps = (population[np.argsort(fitness_scores)[:mu]] - mean) / sigma
+        step = weights @ steps
+        mean = mean + sigma * step
+
+        # Evolution paths
+        inv_sqrt_C = B @ np.diag(1 / D) @ B.T
+        ps = (1 - cs) * ps + np.sqrt(cs * (2 - cs) * mueff) * inv_sqrt_C @ step
+        hsig = np.linalg.norm(ps) / np.sqrt(1 - (1 - cs) ** (2 * (generation + 1))) / chi_n < 1.4 + 2 / (n_params + 1)
+        pc = (1 - cc) * pc + hsig * np.sqrt(cc * (2 - cc) * mueff) * step
+
+        # Covariance and step size adaptation
+        C = ((1 - c1 - cmu) * C +
+             c1 * (np.outer(pc, pc) + (1 - hsig) * cc * (2 - cc) * C) +
+             cmu * (steps.T * weights) @ steps)
+        sigma *= np.exp((cs / damps) * (np.linalg.norm(ps) / chi_n - 1))
+        C = (C + C.T) / 2
+        eigenvalues, B = np.linalg.eigh(C)
+        D = np.sqrt(np.maximum(eigenvalues, 1e-20))
+
+        # a positive tolerance stops the search once the largest step falls below it
+        tolerance = options.get('tolerance')
+        if tolerance and sigma * D.max() < tolerance:
+            logger.info(f"Converged at generation {generation + 1}: step size {sigma * D.max():.6f} < {tolerance}")
+            break
+
+    return convergence.result()
+
+Optimisers = {"genetic": minimize_genetic,
+              "differential_evolution": minimize_differential_evolution,
+              "cma_es": minimize_cma_es}
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,25 @@
+import numpy as np
+
+def init_seed_sequence(seed = None):
+    """Seeds may be None, an int, a SeedSequence or a Generator (which is drawn from once)"""
+    if isinstance(seed, np.random.SeedSequence):
+        return seed
+    if isinstance(seed, np.random.Generator):
+        return np.random.SeedSequence(int(seed.integers(2 ** 63)))
+    return np.random.SeedSequence(seed)
+
+def init_rng(seed = None):
+    if isinstance(seed, np.random.Generator):
+        return seed
+    return np.random.default_rng(init_seed_sequence(seed))
+
+def spawn_seeds(seed, n, offset = 0):
+    """Children [offset, offset + n) of seed, the same streams whichever process asks for them"""
+    root = init_seed_sequence(seed)
+    return [np.random.SeedSequence(root.entropy,
+                                   spawn_key = root.spawn_key + (offset + i,),
+                                   pool_size = root.pool_size)
+            for i in range(n)]
+
+if __name__ == "__main__":
+    pass
@@ -1,65 +1,446 @@
-from model.kernel import ScoreMatrix
+from model.backends import init_backend
+from model.kernel import Rho, dixon_coles_corners
+from model.rng import spawn_seeds
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 import numpy as np
-import random
+import os
+
+def points_bounds(league_table, event_names):
+    """(lowest, number of) integer final points any team can reach after event_names"""
+    n_fixtures = {team["name"]: 0 for team in league_table}
+    for event_name in event_names:
+        for team_name in event_name.split(" vs "):
+            n_fixtures[team_name] += 1
+    low = min([int(np.floor(team["points"])) for team in league_table])
+    high = max([int(np.ceil(team["points"])) + 3 * n_fixtures[team["name"]] for team in league_table])
+    return low, high - low + 1
+
+def calc_points_distributions(team_names, low, counts, quantiles, bands):
+    """Mean, quantiles and band probabilities of each team's final points from counts of paths per points total"""
+    # a quantile is the lowest total whose cumulative probability reaches it; bands are inclusive [low, high] ranges, either end of which may be None
+    values = low + np.arange(counts.shape[1])
+    n_paths = counts.sum(axis = 1, keepdims = True)
+    means = (counts @ values) / n_paths[:, 0]
+    cdfs = np.cumsum(counts, axis = 1) / n_paths
+    quantile_values = values[np.argmax(cdfs[:, :, np.newaxis] >= np.array(quantiles) - 1e-12, axis = 1)]
+    band_masks = np.array([(values >= (-np.inf if band_low is None else band_low)) &
+                           (values <= (np.inf if band_high is None else band_high))
+                           for band_low, band_high in bands], dtype = float).reshape(-1, len(values)).T
+    band_probabilities = counts @ band_masks / n_paths
+    return {str(team_name): {"mean": float(means[i]),
+                             "quantiles": quantile_values[i].tolist(),
+                             "bands": band_probabilities[i].tolist()}
+            for i, team_name in enumerate(team_names)}
 
 class SimPoints:
 
     GDMultiplier = 1e-4
 
     NoiseMultiplier = 1e-8
+
+    ChunkSize = 1000
+
+    PointsQuantiles = [0.05, 0.25, 0.5, 0.75, 0.95]
+
+    N = 11
     
-    def __init__(self, league_table, n_paths):
+    def __init__(self, league_table, n_paths, seed = None, chunk_size = ChunkSize, chunk_offset = 0, backend = "numpy", sensitivities = False):
+        """Chunks from chunk_offset on reproduce the matching slice of a serial run with the same seed"""
         self.n_paths = n_paths
         self.team_names = [team["name"] for team in league_table]
+        self.backend = init_backend(backend)
+        self.chunk_offset = chunk_offset
+        self.chunks = self._init_chunks(seed, chunk_size, chunk_offset)
         self.points = self._init_points_array(league_table)
+        # each path's score (d log likelihood) against every rating and home advantage, for mark_sensitivities()
+        self.score_weights = np.zeros((len(league_table) + 1, n_paths)) if sensitivities else None
+        self.playoff_winners = {}
+
+    def _init_chunks(self, seed, chunk_size, chunk_offset):
+        n_chunks = int(np.ceil(self.n_paths / chunk_size))
+        seeds = spawn_seeds(seed, n_chunks, offset = chunk_offset)
+        return [(min(chunk_size, self.n_paths - i * chunk_size), np.random.default_rng(chunk_seed))
+                for i, chunk_seed in enumerate(seeds)]
 
     def _init_points_array(self, league_table):
         points_array = np.zeros((len(league_table), self.n_paths))
         for i, team in enumerate(league_table):
-            points_with_goal_diff_and_noise = team['points'] + self.GDMultiplier * team['goal_difference'] + self.NoiseMultiplier * (random.random()-0.5)
-            points_array[i, :] = points_with_goal_diff_and_noise
-        return points_array
+            points_array[i, :] = team['points'] + self.GDMultiplier * team['goal_difference']
+        noise = np.concatenate([rng.random((len(league_table), size)) for size, rng in self.chunks], axis = 1)
+        return points_array + self.NoiseMultiplier * (noise - 0.5)
 
     def get_team_points(self, team_name):
         team_index = self.team_names.index(team_name)
         return self.points[team_index]
 
-    def simulate(self, event_name, ratings, home_advantage):    
-        matrix = ScoreMatrix.initialise(event_name = event_name,
-                                        ratings = ratings,
-                                        home_advantage = home_advantage)
-        scores = matrix.simulate_scores(self.n_paths)
-        self.update_event(event_name, scores)
-    
-    def update_home_team(self, team_name, scores):
-        points = np.array([3*int(score[0] > score[1]) + int(score[0] == score[1])
-                           for score in scores])
-        goal_difference = np.array([score[0]-score[1] for score in scores])
-        team_index = self.team_names.index(team_name)
-        self.points[team_index] += points + self.GDMultiplier * goal_difference
+    def fixture_indexes(self, event_names):
+        team_indexes = {team_name: i for i, team_name in enumerate(self.team_names)}
+        event_teams = [event_name.split(" vs ") for event_name in event_names]
+        return (np.array([team_indexes[home_team_name] for home_team_name, _ in event_teams], dtype = np.int64),
+                np.array([team_indexes[away_team_name] for _, away_team_name in event_teams], dtype = np.int64))
 
-    def update_away_team(self, team_name, scores):
-        points = np.array([3*int(score[1] > score[0]) + int(score[0] == score[1])
-                           for score in scores])
-        goal_difference = np.array([score[1]-score[0] for score in scores])
-        team_index = self.team_names.index(team_name)
-        self.points[team_index] += points + self.GDMultiplier * goal_difference
+    def score_matrices(self, home_indexes, away_indexes, ratings, home_advantage, rho = Rho):
+        """Normalised score matrices, shape (n_fixtures, n, n)"""
+        ratings = np.array([ratings[team_name] for team_name in self.team_names])
+        matrices = self.backend.score_matrices(home_lambdas = ratings[home_indexes] * home_advantage,
+                                               away_lambdas = ratings[away_indexes],
+                                               n = self.N,
+                                               rho = rho)
+        return matrices / matrices.sum(axis = (1, 2))[:, np.newaxis, np.newaxis]
+
+    def score_cdfs(self, home_indexes, away_indexes, ratings, home_advantage, rho = Rho):
+        """Normalised cumulative distributions over flattened score cells, shape (n_fixtures, n * n)"""
+        matrices = self.score_matrices(home_indexes, away_indexes, ratings, home_advantage, rho)
+        cdfs = np.cumsum(matrices.reshape(len(matrices), -1), axis = 1)
+        return cdfs / cdfs[:, -1:]
+
+    def fixture_scores(self, home_indexes, away_indexes, ratings, home_advantage, rho = Rho):
+        """Per fixture functions mapping sampled scores to d log p / d (home rating, away rating, home advantage)"""
+        # for the truncated, normalised matrix d log p / d lambda = (goals - expected goals) / lambda, plus d log tau / d lambda less its expectation
+        matrices = self.score_matrices(home_indexes, away_indexes, ratings, home_advantage, rho)
+        goals = np.arange(self.N)
+        expected_home_goals = matrices.sum(axis = 2) @ goals
+        expected_away_goals = matrices.sum(axis = 1) @ goals
+        ratings = np.array([ratings[team_name] for team_name in self.team_names])
+        home_lambdas, away_lambdas = ratings[home_indexes] * home_advantage, ratings[away_indexes]
+        # a zero lambda means a point mass at zero goals, whose score is zero
+        inverse_home_lambdas = np.divide(1, home_lambdas, out = np.zeros(len(home_lambdas)), where = home_lambdas > 0)
+        inverse_away_lambdas = np.divide(1, away_lambdas, out = np.zeros(len(away_lambdas)), where = away_lambdas > 0)
+        # d log tau / d lambda is -mu rho / tau at 0-0 and rho / tau at 0-1, d log tau / d mu is -lambda rho / tau at 0-0 and rho / tau at 1-0; cells floored at zero are never sampled
+        corners = dixon_coles_corners(home_lambdas, away_lambdas, rho)
+        inverse_corners = np.divide(1, corners, out = np.zeros(corners.shape), where = corners > 0)
+        home_corner_scores, away_corner_scores = np.zeros(corners.shape), np.zeros(corners.shape)
+        home_corner_scores[:, 0, 0], home_corner_scores[:, 0, 1] = -away_lambdas * rho, rho
+        away_corner_scores[:, 0, 0], away_corner_scores[:, 1, 0] = -home_lambdas * rho, rho
+        home_corner_scores *= inverse_corners
+        away_corner_scores *= inverse_corners
+        home_corner_scores -= (matrices[:, :2, :2] * home_corner_scores).sum(axis = (1, 2))[:, np.newaxis, np.newaxis]
+        away_corner_scores -= (matrices[:, :2, :2] * away_corner_scores).sum(axis = (1, 2))[:, np.newaxis, np.newaxis]
+        fixtures = np.arange(len(home_lambdas))[:, np.newaxis]
+        def scores(home_goals, away_goals):
+            # cells outside the corner score as 1-1 does, their d log tau being zero too
+            home_cells, away_cells = np.minimum(home_goals, 1), np.minimum(away_goals, 1)
+            in_corner = (home_goals < 2) & (away_goals < 2)
+            home_score = ((home_goals - expected_home_goals[:, np.newaxis]) * inverse_home_lambdas[:, np.newaxis] +
+                          np.where(in_corner, home_corner_scores[fixtures, home_cells, away_cells], home_corner_scores[:, 1, 1][:, np.newaxis]))
+            away_score = ((away_goals - expected_away_goals[:, np.newaxis]) * inverse_away_lambdas[:, np.newaxis] +
+                          np.where(in_corner, away_corner_scores[fixtures, home_cells, away_cells], away_corner_scores[:, 1, 1][:, np.newaxis]))
+            return (home_score * home_advantage,
+                    away_score,
+                    home_score * ratings[home_indexes][:, np.newaxis])
+        return scores
+
+    def simulate(self, event_name, ratings, home_advantage, rho = Rho):
+        self.simulate_fixtures(event_names = [event_name],
+                               ratings = ratings,
+                               home_advantage = home_advantage,
+                               rho = rho)
+
+    def simulate_fixtures(self, event_names, ratings, home_advantage, rho = Rho, mask = None, ensemble = None):
+        """Simulates every fixture on the paths mask allows, one backend pass per chunk"""
+        if event_names == []:
+            return
+        home_indexes, away_indexes = self.fixture_indexes(event_names)
+        # an ensemble of solutions replaces ratings, home_advantage and rho, chunk k (counting from a serial run's chunk 0) taking solution k % len(ensemble)
+        if ensemble is None:
+            ensemble = [{"ratings": ratings,
+                         "home_advantage": home_advantage,
+                         "rho": rho}]
+        models = []
+        for solution in ensemble:
+            params = (home_indexes, away_indexes, solution["ratings"], solution["home_advantage"], solution["rho"])
+            models.append((self.score_cdfs(*params),
+                           None if self.score_weights is None else self.fixture_scores(*params)))
+        offset = 0
+        for i, (size, rng) in enumerate(self.chunks):
+            cdfs, fixture_scores = models[(self.chunk_offset + i) % len(models)]
+            uniforms = rng.random((len(event_names), size))
+            chunk_mask = None if mask is None else mask[:, offset: offset + size]
+            if self.score_weights is None:
+                self.backend.simulate_points(self.points[:, offset: offset + size],
+                                             home_indexes, away_indexes, cdfs, uniforms,
+                                             self.N, self.GDMultiplier, chunk_mask)
+            else:
+                scores = self.backend.sample_scores(cdfs, uniforms)
+                self.backend.accumulate_points(self.points[:, offset: offset + size],
+                                               home_indexes, away_indexes, scores,
+                                               self.N, self.GDMultiplier, chunk_mask)
+                home_scores, away_scores, home_advantage_scores = fixture_scores(scores // self.N, scores % self.N)
+                weights = 1 if chunk_mask is None else chunk_mask
+                score_weights = self.score_weights[:, offset: offset + size]
+                np.add.at(score_weights, home_indexes, weights * home_scores)
+                np.add.at(score_weights, away_indexes, weights * away_scores)
+                score_weights[-1] += (weights * home_advantage_scores).sum(axis = 0)
+            offset += size
+
+    def split_mask(self, event_names, split_size):
+        """(n_fixtures, n_paths) mask of paths on which both teams finish in the same half of each path's own table"""
+        home_indexes, away_indexes = self.fixture_indexes(event_names)
+        top_half = self.backend.positions(self.points) < split_size
+        return top_half[home_indexes] == top_half[away_indexes]
+
+    def simulate_split(self, event_names, ratings, home_advantage, rho = Rho, split_size = 6, ensemble = None):
+        """Plays each candidate post-split fixture on the paths where its teams share a half, and returns the mask"""
+        mask = self.split_mask(event_names, split_size)
+        self.simulate_fixtures(event_names = event_names,
+                               ratings = ratings,
+                               home_advantage = home_advantage,
+                               rho = rho,
+                               mask = mask,
+                               ensemble = ensemble)
+        return mask
+
+    def knockout_cdfs(self, ratings, home_advantage, rho = Rho):
+        """Home and neutral score cdfs, over ninety minutes and extra time, for every ordered pair of teams"""
+        # row home_index * n_teams + away_index; extra time is scored at a third of the rate
+        n_teams = len(self.team_names)
+        home_indexes, away_indexes = np.repeat(np.arange(n_teams), n_teams), np.tile(np.arange(n_teams), n_teams)
+        extra_time_ratings = {team_name: rating / 3 for team_name, rating in ratings.items()}
+        return {"home": self.score_cdfs(home_indexes, away_indexes, ratings, home_advantage, rho),
+                "neutral": self.score_cdfs(home_indexes, away_indexes, ratings, 1, rho),
+                "home_extra_time": self.score_cdfs(home_indexes, away_indexes, extra_time_ratings, home_advantage, rho),
+                "neutral_extra_time": self.score_cdfs(home_indexes, away_indexes, extra_time_ratings, 1, rho)}
+
+    def sample_knockout_scores(self, cdfs, home_indexes, away_indexes, rng):
+        """(home_goals, away_goals) per path, each path playing its own pair of teams"""
+        uniforms = rng.random(len(home_indexes))
+        fixture_cdfs = cdfs[home_indexes * len(self.team_names) + away_indexes]
+        scores = np.minimum((fixture_cdfs <= uniforms[:, np.newaxis]).sum(axis = 1), fixture_cdfs.shape[1] - 1)
+        return scores // self.N, scores % self.N
+
+    def knockout_tie(self, cdfs, higher_indexes, lower_indexes, rng, legs = 1):
+        """Winning team index of one tie per path"""
+        # over two legs the higher seed hosts the second, otherwise the venue is neutral; a level aggregate goes to extra time at the last venue, then a coin flip
+        if legs == 2:
+            lower_goals, higher_goals = self.sample_knockout_scores(cdfs["home"], lower_indexes, higher_indexes, rng)
+            second_higher_goals, second_lower_goals = self.sample_knockout_scores(cdfs["home"], higher_indexes, lower_indexes, rng)
+            higher_goals, lower_goals = higher_goals + second_higher_goals, lower_goals + second_lower_goals
+            extra_time_cdfs = cdfs["home_extra_time"]
+        else:
+            higher_goals, lower_goals = self.sample_knockout_scores(cdfs["neutral"], higher_indexes, lower_indexes, rng)
+            extra_time_cdfs = cdfs["neutral_extra_time"]
+        # extra time and coin flips are drawn on every path, so each chunk's stream advances by the same amount whatever the scores
+        level = higher_goals == lower_goals
+        extra_higher_goals, extra_lower_goals = self.sample_knockout_scores(extra_time_cdfs, higher_indexes, lower_indexes, rng)
+        higher_goals, lower_goals = higher_goals + level * extra_higher_goals, lower_goals + level * extra_lower_goals
+        coin_flips = rng.random(len(higher_indexes)) < 0.5
+        higher_wins = (higher_goals > lower_goals) | ((higher_goals == lower_goals) & coin_flips)
+        return np.where(higher_wins, higher_indexes, lower_indexes)
+
+    def simulate_playoff(self, positions, ratings, home_advantage, rho = Rho, ensemble = None):
+        """Plays off the teams finishing in positions on each path and returns the winner index per path"""
+        # positions are four, one-based and in seeding order: two-legged semi-finals of first against fourth and second against third, then a neutral final
+        if len(positions) != 4:
+            raise RuntimeError("playoff needs four positions")
+        if ensemble is None:
+            ensemble = [{"ratings": ratings,
+                         "home_advantage": home_advantage,
+                         "rho": rho}]
+        models = [self.knockout_cdfs(solution["ratings"], solution["home_advantage"], solution["rho"])
+                  for solution in ensemble]
+        seeds = np.argsort(self.backend.positions(self.points), axis = 0)[np.array(positions) - 1]
+        winners = np.empty(self.n_paths, dtype = np.int64)
+        offset = 0
+        for i, (size, rng) in enumerate(self.chunks):
+            cdfs = models[(self.chunk_offset + i) % len(models)]
+            chunk_seeds = seeds[:, offset: offset + size]
+            finalists = [self.knockout_tie(cdfs, chunk_seeds[0], chunk_seeds[3], rng, legs = 2),
+                         self.knockout_tie(cdfs, chunk_seeds[1], chunk_seeds[2], rng, legs = 2)]
+            winners[offset: offset + size] = self.knockout_tie(cdfs, *finalists, rng)
+            offset += size
+        self.playoff_winners[tuple(positions)] = winners
+        return winners
+
+    def playoff_counts(self, positions):
+        if tuple(positions) not in self.playoff_winners:
+            raise RuntimeError("no playoff was simulated for positions %s" % ", ".join([str(position) for position in positions]))
+        return np.bincount(self.playoff_winners[tuple(positions)], minlength = len(self.team_names))
 
-    def update_event(self, event_name, scores):
-        home_team_name, away_team_name = event_name.split(" vs ")
-        self.update_home_team(home_team_name, scores)
-        self.update_away_team(away_team_name, scores)
+    def playoff_probabilities(self, positions):
+        """Probability of each team winning the playoff between positions"""
+        probabilities = self.playoff_counts(positions) / self.n_paths
+        return {str(team_name): float(probabilities[i])
+                for i, team_name in enumerate(self.team_names)}
 
     def position_probabilities(self, team_names=None):
         if team_names is None:
             team_names = self.team_names
         mask = np.isin(self.team_names, team_names)
-        points = self.points[mask]
-        positions = len(points) - np.argsort(np.argsort(points, axis=0), axis=0) - 1
-        probabilities = np.zeros((len(points), len(points)))
-        np.add.at(probabilities, (np.arange(len(points))[:, None], positions), 1 / self.n_paths)
+        probabilities = self.backend.position_counts(self.points[mask]) / self.n_paths
         return {str(team_name): probabilities[i].tolist()
                 for i, team_name in enumerate(np.array(self.team_names)[mask])}
 
+    def points_counts(self, low = None, n_bins = None):
+        """(low, counts) of paths on which each team finishes on points low, low + 1, .., shape (n_teams, n_bins)"""
+        # goal difference and noise are well under half a point, so rounding recovers whole points
+        points = np.rint(self.points).astype(np.int64)
+        if low is None:
+            low = int(points.min())
+            n_bins = int(points.max()) - low + 1
+        n_teams = len(points)
+        cells = np.arange(n_teams)[:, np.newaxis] * n_bins + (points - low)
+        return low, np.bincount(cells.flatten(), minlength = n_teams * n_bins).reshape(n_teams, n_bins)
+
+    def points_distributions(self, quantiles = PointsQuantiles, bands = []):
+        return calc_points_distributions(self.team_names, *self.points_counts(), quantiles, bands)
+
+    def mark_sensitivities(self, payoff, team_names = None):
+        """Each team's mark with its likelihood-ratio gradients to every rating and home advantage"""
+        if self.score_weights is None:
+            raise RuntimeError("SimPoints was initialised without sensitivities")
+        if team_names is None:
+            team_names = self.team_names
+        mask = np.isin(self.team_names, team_names)
+        payoffs = np.array(payoff, dtype = float)[self.backend.positions(self.points[mask])]
+        marks = payoffs.mean(axis = 1)
+        gradients = (payoffs - marks[:, np.newaxis]) @ self.score_weights.T / self.n_paths
+        return {str(team_name): {"mark": float(marks[i]),
+                                 "ratings": {rated_team_name: float(gradient)
+                                             for rated_team_name, gradient in zip(self.team_names, gradients[i, :-1])},
+                                 "home_advantage": float(gradients[i, -1])}
+                for i, team_name in enumerate(np.array(self.team_names)[mask])}
+
+def simulate_block(block):
+    """Pool worker, writing one block's counts into its slot of the shared buffer"""
+    # slot layout: each group's position counts, final points counts, then each playoff's winner counts
+    buffer = shared_memory.SharedMemory(name = block["buffer_name"])
+    try:
+        slots = np.ndarray(block["buffer_shape"], dtype = np.int64, buffer = buffer.buf)
+        sim_points = SimPoints(block["league_table"], block["n_paths"],
+                               seed = block["seed"],
+                               chunk_size = block["chunk_size"],
+                               chunk_offset = block["chunk_offset"],
+                               backend = block["backend"])
+        sim_points.simulate_fixtures(event_names = block["event_names"],
+                                     ratings = block["ratings"],
+                                     home_advantage = block["home_advantage"],
+                                     rho = block["rho"],
+                                     ensemble = block["ensemble"])
+        counts = []
+        if block["split_fixtures"]:
+            sim_points.simulate_split(event_names = block["split_fixtures"],
+                                      ratings = block["ratings"],
+                                      home_advantage = block["home_advantage"],
+                                      rho = block["rho"],
+                                      split_size = block["split_size"],
+                                      ensemble = block["ensemble"])
+        for positions in block["playoffs"]:
+            sim_points.simulate_playoff(positions = positions,
+                                        ratings = block["ratings"],
+                                        home_advantage = block["home_advantage"],
+                                        rho = block["rho"],
+                                        ensemble = block["ensemble"])
+        for group in block["groups"]:
+            counts.append(sim_points.backend.position_counts(sim_points.points[np.isin(sim_points.team_names, group)]).flatten())
+        counts.append(sim_points.points_counts(*block["points_bounds"])[1].flatten())
+        for positions in block["playoffs"]:
+            counts.append(sim_points.playoff_counts(positions))
+        slots[block["slot"]] = np.concatenate(counts)
+    finally:
+        buffer.close()
+
+class SimPointsPool:
+    """SimPoints split by whole chunks across a process pool, matching a serial run with the same seed and chunk_size"""
+
+    def __init__(self, league_table, n_paths, seed = None, chunk_size = SimPoints.ChunkSize, backend = "numpy", n_workers = None):
+        self.league_table = league_table
+        self.n_paths = n_paths
+        self.team_names = [team["name"] for team in league_table]
+        self.seed = seed
+        self.chunk_size = chunk_size
+        self.backend = backend
+        n_chunks = int(np.ceil(n_paths / chunk_size))
+        self.n_workers = max(1, min(n_workers or os.cpu_count() or 1, n_chunks))
+        self.counts = {}
+        self.points_low, self.points_counts = None, None
+        self.playoff_winner_counts = {}
+
+    def group_key(self, team_names = None):
+        """Group members in league table order, as SimPoints.position_probabilities masks them"""
+        if team_names is None:
+            return tuple(self.team_names)
+        return tuple([team_name for team_name in self.team_names if team_name in team_names])
+
+    def blocks(self):
+        """(chunk_offset, n_paths) per worker"""
+        n_chunks = int(np.ceil(self.n_paths / self.chunk_size))
+        bounds = np.linspace(0, n_chunks, self.n_workers + 1).astype(int)
+        return [(start, min(end * self.chunk_size, self.n_paths) - start * self.chunk_size)
+                for start, end in zip(bounds[:-1], bounds[1:])]
+
+    def simulate(self, event_names, ratings, home_advantage, rho = Rho, split_fixtures = [], split_size = 6, ensemble = None, groups = [None], playoffs = []):
+        """Simulates event_names, split_fixtures and playoffs across the pool and collects their counts"""
+        keys = [self.group_key(group) for group in groups]
+        low, n_bins = points_bounds(self.league_table, event_names + split_fixtures)
+        sizes = ([len(key) * len(key) for key in keys] +
+                 [len(self.team_names) * n_bins] +
+                 [len(self.team_names)] * len(playoffs))
+        buffer_shape = (self.n_workers, sum(sizes))
+        buffer = shared_memory.SharedMemory(create = True, size = max(1, int(np.prod(buffer_shape))) * 8)
+        try:
+            slots = np.ndarray(buffer_shape, dtype = np.int64, buffer = buffer.buf)
+            slots[:] = 0
+            blocks = [{"buffer_name": buffer.name,
+                       "buffer_shape": buffer_shape,
+                       "slot": slot,
+                       "league_table": self.league_table,
+                       "n_paths": n_paths,
+                       "seed": self.seed,
+                       "chunk_size": self.chunk_size,
+                       "chunk_offset": chunk_offset,
+                       "backend": self.backend,
+                       "event_names": event_names,
+                       "ratings": ratings,
+                       "home_advantage": home_advantage,
+                       "rho": rho,
+                       "ensemble": ensemble,
+                       "split_fixtures": split_fixtures,
+                       "split_size": split_size,
+                       "groups": [list(key) for key in keys],
+                       "points_bounds": (low, n_bins),
+                       "playoffs": [list(positions) for positions in playoffs]}
+                      for slot, (chunk_offset, n_paths) in enumerate(self.blocks())]
+            if self.n_workers == 1:
+                for block in blocks:
+                    simulate_block(block)
+            else:
+                with ProcessPoolExecutor(max_workers = self.n_workers) as executor:
+                    list(executor.map(simulate_block, blocks))
+            totals = slots.sum(axis = 0)
+        finally:
+            buffer.close()
+            buffer.unlink()
+        offset = 0
+        for key, size in zip(keys, sizes):
+            self.counts[key] = totals[offset: offset + size].reshape(len(key), len(key))
+            offset += size
+        self.points_low = low
+        self.points_counts = totals[offset: offset + sizes[len(keys)]].reshape(len(self.team_names), n_bins)
+        offset += sizes[len(keys)]
+        for positions in playoffs:
+            self.playoff_winner_counts[tuple(positions)] = totals[offset: offset + len(self.team_names)]
+            offset += len(self.team_names)
+
+    def position_probabilities(self, team_names = None):
+        key = self.group_key(team_names)
+        if key not in self.counts:
+            raise RuntimeError("no position counts were collected for %s" % ", ".join(key))
+        probabilities = self.counts[key] / self.n_paths
+        return {str(team_name): probabilities[i].tolist()
+                for i, team_name in enumerate(key)}
+
+    def playoff_probabilities(self, positions):
+        if tuple(positions) not in self.playoff_winner_counts:
+            raise RuntimeError("no playoff counts were collected for positions %s" % ", ".join([str(position) for position in positions]))
+        probabilities = self.playoff_winner_counts[tuple(positions)] / self.n_paths
+        return {str(team_name): float(probabilities[i])
+                for i, team_name in enumerate(self.team_names)}
+
+    def points_distributions(self, quantiles = SimPoints.PointsQuantiles, bands = []):
+        if self.points_counts is None:
+            raise RuntimeError("no points counts were collected")
+        return calc_points_distributions(self.team_names, self.points_low, self.points_counts, quantiles, bands)
+
 if __name__=="__main__":
     pass
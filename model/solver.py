@@ -1,133 +1,171 @@
-from model.kernel import ScoreMatrix
+from model.backends import init_backend
+from model.kernel import Rho, batch_match_odds, batch_over_under, batch_asian_handicap, skellam_match_odds, surrogate_match_odds
+from model.optimisers import Optimisers
+from model.rng import init_rng, spawn_seeds
 from model.state import calc_league_table
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
-import math
 import logging
-import random
+import os
 
 RatingRange = (0, 6)
 HomeAdvantageRange = (1, 1.5)
+RhoRange = (-0.3, 0.3)
 
-class OptimizationResult:
-    def __init__(self, x, fun, success=True):
-        self.x = x
-        self.fun = fun
-        self.success = success
+# bootstrap base and replicate solutions are converged by CMA-ES until its step size falls below BootstrapTolerance, or for at most BootstrapIterations generations
+BootstrapIterations = 500
 
-def minimize(objective, x0, bounds=None, options=None):
-    """Parallel genetic algorithm with population-based optimization"""
-    if options is None:
-        options = {}
-    
-    max_iter = options.get('maxiter')
-    population_size = options.get('population_size')
-    mutation_factor = options.get('mutation_factor')
-    elite_ratio = options.get('elite_ratio')
-    logger = logging.getLogger(__name__)
-    
-    n_params = len(x0)
-    n_elite = max(1, int(population_size * elite_ratio))
-    
-    logger.info(f"Starting parallel genetic algorithm: {max_iter} generations, {population_size} candidates per generation")
-    
-    # Initialize population - shape: (population_size, n_params)
-    population = []
-    
-    # First candidate: use league table-sorted initial guess (x0)
-    population.append(np.array(x0, dtype=float))
-    
-    # Remaining candidates: random within bounds
-    for _ in range(population_size - 1):
-        if bounds:
-            candidate = np.array([np.random.uniform(low, high) for low, high in bounds])
+BootstrapTolerance = 1e-3
+
+BootstrapInitStd = 0.1
+
+# rho is optimised in units of 1 / RhoScale, so that optimiser step sizes suited to ratings suit rho too
+RhoScale = 10
+
+MatchOdds, OverUnder, AsianHandicap = "match_odds", "over_under", "asian_handicap"
+
+MarketPricers = {MatchOdds: lambda matrices, lines: batch_match_odds(matrices),
+                 OverUnder: batch_over_under,
+                 AsianHandicap: batch_asian_handicap}
+
+def market_probabilities(prices):
+    probs = [1 / price for price in prices]
+    overround = sum(probs)
+    return [prob / overround for prob in probs]
+
+class TrainingSet:
+    """Training events indexed by team so that every market line is priced in one batch"""
+
+    N = 11
+
+    def __init__(self, events, team_names, fit_markets = [MatchOdds], backend = "numpy", surrogate = False):
+        """Events are fitted on fit_markets, and surrogate applies only when match odds are the sole market"""
+        unknown = [market for market in fit_markets if market not in MarketPricers]
+        if unknown != []:
+            raise RuntimeError("unknown fit markets %s" % ", ".join(unknown))
+        self.backend = init_backend(backend)
+        # match odds alone are priced by skellam_match_odds (or surrogate_match_odds), without full score matrices
+        self.match_odds_only = list(fit_markets) == [MatchOdds]
+        self.surrogate = surrogate and self.match_odds_only
+        events = [event for event in events
+                  if any(market in event for market in fit_markets)]
+        team_indexes = {team_name: i for i, team_name in enumerate(team_names)}
+        event_teams = [event["name"].split(" vs ") for event in events]
+        self.n_events = len(events)
+        self.home_indexes = np.array([team_indexes[home_team_name]
+                                      for home_team_name, _ in event_teams], dtype = int)
+        self.away_indexes = np.array([team_indexes[away_team_name]
+                                      for _, away_team_name in event_teams], dtype = int)
+        teams = np.arange(len(team_names))[:, np.newaxis]
+        self.team_events = (self.home_indexes == teams) | (self.away_indexes == teams)
+        self.markets = {}
+        for market in fit_markets:
+            event_indexes = [i for i, event in enumerate(events) if market in event]
+            rows = np.full(self.n_events, -1, dtype = int)
+            rows[event_indexes] = np.arange(len(event_indexes))
+            self.markets[market] = {"rows": rows,
+                                    "lines": np.array([events[i][market].get("line", 0)
+                                                       for i in event_indexes], dtype = float),
+                                    "probabilities": np.array([market_probabilities(events[i][market]["prices"])
+                                                               for i in event_indexes]).reshape(len(event_indexes), -1 if event_indexes else 1)}
+        self.n_markets = np.zeros(self.n_events)
+        for data in self.markets.values():
+            self.n_markets[data["rows"] >= 0] += 1
+
+    def event_errors(self, ratings, home_advantage, rho = Rho, event_indexes = None):
+        """Mean RMS error across fitted markets for each event in event_indexes (default all)"""
+        if event_indexes is None:
+            event_indexes = np.arange(self.n_events)
+        ratings = np.asarray(ratings, dtype = float)
+        home_lambdas = ratings[self.home_indexes[event_indexes]] * home_advantage
+        away_lambdas = ratings[self.away_indexes[event_indexes]]
+        if not self.match_odds_only:
+            matrices = self.backend.score_matrices(home_lambdas = home_lambdas,
+                                                   away_lambdas = away_lambdas,
+                                                   n = self.N,
+                                                   rho = rho)
+        errors = np.zeros(len(event_indexes))
+        for market, data in self.markets.items():
+            rows = data["rows"][event_indexes]
+            priced = rows >= 0
+            if self.surrogate:
+                probabilities = surrogate_match_odds(home_lambdas[priced], away_lambdas[priced], rho, self.N)
+            elif self.match_odds_only:
+                probabilities = skellam_match_odds(home_lambdas[priced], away_lambdas[priced], rho, self.N)
+            else:
+                probabilities = MarketPricers[market](matrices[priced], data["lines"][rows[priced]])
+            errors[priced] += np.sqrt(np.mean((probabilities - data["probabilities"][rows[priced]]) ** 2, axis = 1))
+        return errors / self.n_markets[event_indexes]
+
+    def error(self, ratings, home_advantage, rho = Rho):
+        return float(np.mean(self.event_errors(ratings, home_advantage, rho)))
+
+class IncrementalObjective:
+    """Mean training error, re-pricing only events whose parameters moved since the parent candidate"""
+
+    def __init__(self, training_set, unpack, n_teams):
+        self.training_set = training_set
+        self.unpack = unpack
+        self.n_teams = n_teams
+        self.priced_events = 0
+        self.total_events = 0
+
+    def evaluate(self, params, parent = None):
+        """(error, per-event errors), reusing parent's errors for events whose parameters are unchanged"""
+        params = np.asarray(params, dtype = float)
+        if parent is None:
+            event_indexes, errors = np.arange(self.training_set.n_events), np.zeros(self.training_set.n_events)
         else:
-            init_std = options.get('init_std')
-            candidate = np.array(x0) + np.random.normal(0, init_std, n_params)
-        population.append(candidate)
-    
-    population = np.array(population)
-    
-    best_fitness = float('inf')
-    best_solution = None
-    
-    for generation in range(max_iter):
-        # Evaluate all candidates in parallel
-        fitness_scores = np.array([objective(individual) for individual in population])
-        
-        # Find best solution
-        best_idx = np.argmin(fitness_scores)
-        if fitness_scores[best_idx] < best_fitness:
-            best_fitness = fitness_scores[best_idx]
-            best_solution = population[best_idx].copy()
-        
-        # Log progress
-        log_interval = options.get('log_interval')
-        if generation % log_interval == 0 or generation == max_iter - 1:
-            avg_fitness = np.mean(fitness_scores)
-            time_remaining = (max_iter - generation) / max_iter
-            current_mutation = mutation_factor * (time_remaining ** 0.5)
-            logger.info(f"Generation {generation + 1}/{max_iter}: best={best_fitness:.6f}, avg={avg_fitness:.6f}, mutation={current_mutation:.4f}")
-        
-        # Check convergence
-        excellent_error = options.get('excellent_error')
-        max_error = options.get('max_error')
-        
-        if best_fitness <= excellent_error:
-            logger.info(f"Excellent result achieved at generation {generation + 1}: error {best_fitness:.6f} ≤ {excellent_error}")
-            break
-            
-        if best_fitness > max_error and generation == max_iter - 1:
-            logger.warning(f"Max generations reached with error {best_fitness:.6f} > {max_error}")
-        
-        # Selection: keep elite performers
-        elite_indices = np.argsort(fitness_scores)[:n_elite]
-        elite_population = population[elite_indices]
-        
-        # Generate new population
-        new_population = []
-        
-        # Keep elite unchanged
-        for i in range(n_elite):
-            new_population.append(elite_population[i].copy())
-        
-        # Calculate decay factor for this generation
-        time_remaining = (max_iter - generation) / max_iter  # Goes from 1.0 to 0.0
-        decay_exponent = options.get('decay_exponent')
-        decay_factor = time_remaining ** decay_exponent
-        current_mutation_factor = mutation_factor * decay_factor
-        
-        # Generate offspring from elite
-        while len(new_population) < population_size:
-            # Select random elite parent
-            parent_idx = np.random.randint(0, n_elite)
-            parent = elite_population[parent_idx].copy()
-            
-            # Apply mutations with decay
-            mutation_probability = options.get('mutation_probability')
-            for i in range(n_params):
-                if np.random.random() < mutation_probability:
-                    mutation = np.random.normal(0, current_mutation_factor)
-                    parent[i] += mutation
-                    
-                    # Clamp to bounds
-                    if bounds and bounds[i]:
-                        low, high = bounds[i]
-                        parent[i] = max(low, min(high, parent[i]))
-            
-            new_population.append(parent)
-        
-        population = np.array(new_population)
-    
-    logger.info(f"Parallel optimization completed. Final objective value: {best_fitness:.6f}")
-    return OptimizationResult(best_solution, best_fitness)
+            parent_params, parent_errors = parent
+            changed = np.flatnonzero(params != parent_params)
+            if np.any(changed >= self.n_teams):
+                event_indexes = np.arange(self.training_set.n_events)
+            else:
+                event_indexes = np.flatnonzero(self.training_set.team_events[changed].any(axis = 0))
+            errors = parent_errors.copy()
+        ratings, home_advantage, rho = self.unpack(params)
+        if len(event_indexes) > 0:
+            errors[event_indexes] = self.training_set.event_errors(ratings = ratings,
+                                                                   home_advantage = home_advantage,
+                                                                   rho = rho,
+                                                                   event_indexes = event_indexes)
+        self.priced_events += len(event_indexes)
+        self.total_events += self.training_set.n_events
+        return float(np.mean(errors)), errors
+
+    def __call__(self, params):
+        return self.evaluate(params)[0]
+
+    @property
+    def saving(self):
+        """Fraction of event pricings avoided relative to full re-evaluation"""
+        return 1 - self.priced_events / self.total_events if self.total_events else 0
+
+def solve_replicate(kwargs):
+    """Module-level so that bootstrap replicates can be solved in worker processes"""
+    return RatingsSolver().converge(**kwargs)
 
+def centre_replicates(replicates, solution):
+    """Shifts replicates so that their mean ratings, home advantage and rho are those of solution"""
+    # match odds barely pin the overall scale of the ratings, so resampling biases it even from a converged solution
+    centred = [dict(replicate, ratings = dict(replicate["ratings"])) for replicate in replicates]
+    for team_name, rating in solution["ratings"].items():
+        shift = rating - np.mean([replicate["ratings"][team_name] for replicate in replicates])
+        for replicate in centred:
+            replicate["ratings"][team_name] = float(np.clip(replicate["ratings"][team_name] + shift, *RatingRange))
+    for key, value_range in [("home_advantage", HomeAdvantageRange),
+                             ("rho", RhoRange)]:
+        shift = solution[key] - np.mean([replicate[key] for replicate in replicates])
+        for replicate in centred:
+            replicate[key] = float(np.clip(replicate[key] + shift, *value_range))
+    return centred
 
 class RatingsSolver:
 
     def __init__(self):
         self.logger = logging.getLogger(__name__)
     
-    def initialize_ratings_from_league_table(self, team_names, events, rating_range=(0, 6)):
+    def initialize_ratings_from_league_table(self, team_names, events, rating_range=(0, 6), seed=None):
         """Initialize team ratings based on league table points using existing calc_league_table"""
         # Use existing league table calculation
         league_table = calc_league_table(team_names, events, handicaps={})
@@ -135,7 +173,8 @@ class RatingsSolver:
         # If no results available, use random initialization
         if not league_table or all(team['points'] == 0 for team in league_table):
             self.logger.info("No match events found, using random initialization")
-            return {team: random.uniform(*rating_range) for team in team_names}
+            rng = init_rng(seed)
+            return {team: rng.uniform(*rating_range) for team in team_names}
         
         # Map league position to rating range
         min_rating, max_rating = rating_range
@@ -156,80 +195,82 @@ class RatingsSolver:
     def rms_error(self, X, Y):
         return np.sqrt(np.mean((np.array(X) - np.array(Y)) ** 2))
 
-    def extract_market_probabilities(self, event):
-        """Extract normalized probabilities from match odds prices"""
-        prices = event["match_odds"]["prices"]
-        probs = [1 / price for price in prices]
-        overround = sum(probs)
-        return [prob / overround for prob in probs]
+    def extract_market_probabilities(self, event, attr = MatchOdds):
+        """Extract normalized probabilities from market prices"""
+        return market_probabilities(event[attr]["prices"])
     
-    def calc_error(self, events, ratings, home_advantage):
+    def calc_error(self, events, ratings, home_advantage, rho = Rho, fit_markets = [MatchOdds], backend = "numpy"):
         """Calculate RMS error for single ratings configuration"""
-        matrices = [ScoreMatrix.initialise(event_name = event["name"],
-                                           ratings = ratings,
-                                           home_advantage = home_advantage)
-                    for event in events]        
-        errors = [self.rms_error(matrix.match_odds,
-                                 self.extract_market_probabilities(event))
-                  for event, matrix in zip(events, matrices)]
-        return np.mean(errors)
-
-    def optimise_ratings(self, events, ratings, home_advantage, options,
-                         rating_range = RatingRange):
-        self.logger.info(f"Starting ratings optimization for {len(ratings)} teams with fixed home advantage {home_advantage}")
-        
         team_names = sorted(list(ratings.keys()))
-        optimiser_ratings = [ratings[team_name] for team_name in team_names]
-        optimiser_bounds = [rating_range] * len(optimiser_ratings)
-
-        def objective(params):
-            for i, team in enumerate(team_names):
-                ratings[team] = params[i]
-            return self.calc_error(events = events,
-                                   ratings = ratings,
-                                   home_advantage = home_advantage)
+        training_set = TrainingSet(events = events,
+                                   team_names = team_names,
+                                   fit_markets = fit_markets,
+                                   backend = backend)
+        return training_set.error(ratings = [ratings[team_name] for team_name in team_names],
+                                  home_advantage = home_advantage,
+                                  rho = rho)
 
-        result = minimize(objective,
-                         optimiser_ratings,
-                         bounds = optimiser_bounds,
-                         options = options)
+    def optimise(self, events, ratings, options,
+                 home_advantage = None,
+                 rho = Rho,
+                 fit_markets = [MatchOdds],
+                 optimiser = "genetic",
+                 backend = "numpy",
+                 seed = None,
+                 warm_start = None,
+                 surrogate = False,
+                 rating_range = RatingRange,
+                 bias_range = HomeAdvantageRange,
+                 rho_range = RhoRange):
+        """Optimise ratings, plus home advantage and rho where these are passed as None"""
+        solved = [name for name, value in [("home advantage", home_advantage),
+                                           ("rho", rho)] if value is None]
+        if optimiser not in Optimisers:
+            raise RuntimeError(f"unknown optimiser {optimiser}")
+        self.logger.info(f"Starting {optimiser} optimization of {len(ratings)} team ratings" + "".join([f" and {name}" for name in solved]))
         
-        for i, team in enumerate(team_names):
-            ratings[team] = result.x[i]
-        self.logger.info(f"Ratings optimization completed with final error: {result.fun:.6f}")
+        team_names = sorted(list(ratings.keys()))
+        optimiser_params = [ratings[team_name] for team_name in team_names]
+        optimiser_bounds = [rating_range] * len(optimiser_params)
+        if home_advantage is None:
+            optimiser_params.append(warm_start["home_advantage"] if warm_start else sum(bias_range) / 2)
+            optimiser_bounds.append(bias_range)
+        if rho is None:
+            optimiser_params.append(RhoScale * (warm_start["rho"] if warm_start else Rho))
+            optimiser_bounds.append(tuple([RhoScale * value for value in rho_range]))
+        training_set = TrainingSet(events = events,
+                                   team_names = team_names,
+                                   fit_markets = fit_markets,
+                                   backend = backend,
+                                   surrogate = surrogate and rho is not None) # the surrogate grid is built for a fixed rho
 
-    def optimise_ratings_and_bias(self, events, ratings, options,
-                                  rating_range = RatingRange,
-                                  bias_range = HomeAdvantageRange):
-        self.logger.info(f"Starting joint optimization of {len(ratings)} team ratings and home advantage")
+        def unpack(params):
+            extra_params = list(params[len(team_names):])
+            return (params[:len(team_names)],
+                    extra_params.pop(0) if home_advantage is None else home_advantage,
+                    extra_params.pop(0) / RhoScale if rho is None else rho)
         
-        team_names = sorted(list(ratings.keys()))
-        optimiser_ratings = [ratings[team_name] for team_name in team_names]
-        optimiser_bias = sum(bias_range) / 2
-        optimiser_bounds = [rating_range] * len(optimiser_ratings) + [bias_range]
-        optimiser_params = optimiser_ratings + [optimiser_bias]
+        objective = IncrementalObjective(training_set = training_set,
+                                         unpack = unpack,
+                                         n_teams = len(team_names))
 
-        def objective(params):
-            for i, team in enumerate(team_names):
-                ratings[team] = params[i]
-            home_advantage = params[-1]
-            return self.calc_error(events = events,
-                                   ratings = ratings,
-                                   home_advantage = home_advantage)
+        result = Optimisers[optimiser](objective,
+                                       optimiser_params,
+                                       bounds = optimiser_bounds,
+                                       options = options,
+                                       seed = seed)
 
-        result = minimize(objective,
-                         optimiser_params,
-                         bounds = optimiser_bounds,
-                         options = options)
-        
+        ratings_params, home_advantage, rho = unpack(result.x)
         for i, team in enumerate(team_names):
-            ratings[team] = result.x[i]
-        home_advantage = result.x[-1]
-        self.logger.info(f"Joint optimization completed with final error: {result.fun:.6f}, home advantage: {home_advantage:.6f}")
-        return home_advantage        
+            ratings[team] = ratings_params[i]
+        self.logger.info(f"Optimization completed with final error: {result.fun:.6f}, home advantage: {home_advantage:.6f}, rho: {rho:.6f}")
+        self.logger.info(f"Incremental objective priced {objective.priced_events} of {objective.total_events} events ({100 * objective.saving:.1f}% saving)")
+        result.objective_saving = objective.saving
+        return home_advantage, rho, result
 
     def solve(self, events, ratings,
               home_advantage = None,
+              rho = Rho,
               max_iterations = 50,
               population_size = 8,
               mutation_factor = 0.1,
@@ -240,16 +281,29 @@ class RatingsSolver:
               mutation_probability = 0.3,
               exploration_interval = 50,
               n_exploration_points = 10,
+              differential_weight = 0.8,
+              crossover_probability = 0.9,
               excellent_error = 0.03,
               max_error = 0.05,
+              tolerance = 0,
               use_league_table_init = True,
+              fit_markets = [MatchOdds],
+              optimiser = "genetic",
+              backend = "numpy",
+              seed = None,
+              warm_start = None,
+              surrogate = False,
               results = []):
+        """warm_start is a previous solution to start from, in place of league table initialisation"""
         self.logger.info(f"Starting solver with {len(events)} events, max_iterations={max_iterations}")
+        init_seed, optimiser_seed = spawn_seeds(seed, 2)
         
+        if warm_start:
+            ratings.update(warm_start["ratings"])
         # Optionally initialize ratings from league table instead of using provided ratings
-        if use_league_table_init and results:
+        elif use_league_table_init and results:
             team_names = sorted(list(ratings.keys()))
-            league_table_ratings = self.initialize_ratings_from_league_table(team_names, results)
+            league_table_ratings = self.initialize_ratings_from_league_table(team_names, results, seed = init_seed)
             ratings.update(league_table_ratings)  # Update the provided ratings dict
         
         optimization_options = {
@@ -263,27 +317,88 @@ class RatingsSolver:
             'mutation_probability': mutation_probability,
             'exploration_interval': exploration_interval,
             'n_exploration_points': n_exploration_points,
+            'differential_weight': differential_weight,
+            'crossover_probability': crossover_probability,
             'excellent_error': excellent_error,
-            'max_error': max_error
+            'max_error': max_error,
+            'tolerance': tolerance
         }
         
-        if home_advantage:
-            self.optimise_ratings(events = events,
-                                  ratings = ratings,
-                                  home_advantage = home_advantage,
-                                  options = optimization_options)
-        else:
-            home_advantage = self.optimise_ratings_and_bias(events = events,
-                                                            ratings = ratings,
-                                                            options = optimization_options)
+        home_advantage, rho, result = self.optimise(events = events,
+                                                    ratings = ratings,
+                                                    options = optimization_options,
+                                                    home_advantage = home_advantage if home_advantage else None,
+                                                    rho = rho,
+                                                    fit_markets = fit_markets,
+                                                    optimiser = optimiser,
+                                                    backend = backend,
+                                                    seed = optimiser_seed,
+                                                    warm_start = warm_start,
+                                                    surrogate = surrogate)
         error = self.calc_error(events = events,
                                 ratings = ratings,
-                                home_advantage = home_advantage)
+                                home_advantage = home_advantage,
+                                rho = rho,
+                                fit_markets = fit_markets,
+                                backend = backend)
         
         self.logger.info(f"Solver completed with final error: {error:.6f}")
         return {"ratings": {k: float(v) for k, v in ratings.items()},
                 "home_advantage": float(home_advantage),
-                "error": float(error)}
+                "rho": float(rho),
+                "error": float(error),
+                "n_evaluations": result.n_evaluations,
+                "evaluations_to_target": result.evaluations_to_target,
+                "objective_saving": float(result.objective_saving)}
+
+    def converge(self, events, solution,
+                 max_iterations = BootstrapIterations,
+                 tolerance = BootstrapTolerance,
+                 **kwargs):
+        """Re-solves events by CMA-ES from solution until its step size falls below tolerance"""
+        return self.solve(**dict(kwargs,
+                                 events = events,
+                                 ratings = dict(solution["ratings"]),
+                                 optimiser = "cma_es",
+                                 init_std = BootstrapInitStd,
+                                 excellent_error = 0,
+                                 max_iterations = max_iterations,
+                                 tolerance = tolerance,
+                                 warm_start = solution))
+
+    def bootstrap(self, events, solution,
+                  n_replicates = 8,
+                  max_iterations = BootstrapIterations,
+                  tolerance = BootstrapTolerance,
+                  n_workers = None,
+                  seed = None,
+                  converged = False,
+                  **kwargs):
+        """Solutions for n_replicates resamplings of events, with kwargs passed to solve()"""
+        self.logger.info(f"Bootstrapping {n_replicates} replicates of {len(events)} events, max_iterations={max_iterations}")
+        # replicates run to convergence from the base, so unless it is already converged it is brought to the same standard, or the ensemble would centre on optimiser drift
+        if not converged:
+            solution = self.converge(events = events,
+                                     solution = solution,
+                                     max_iterations = max_iterations,
+                                     tolerance = tolerance,
+                                     seed = spawn_seeds(seed, 1, offset = n_replicates)[0],
+                                     **kwargs)
+        replicates = []
+        for replicate_seed in spawn_seeds(seed, n_replicates):
+            resample_seed, solve_seed = spawn_seeds(replicate_seed, 2)
+            event_indexes = init_rng(resample_seed).integers(0, len(events), len(events))
+            replicates.append(dict(kwargs,
+                                   events = [events[i] for i in event_indexes],
+                                   solution = solution,
+                                   max_iterations = max_iterations,
+                                   tolerance = tolerance,
+                                   seed = solve_seed))
+        n_workers = min(n_workers or os.cpu_count() or 1, n_replicates)
+        if n_workers == 1:
+            return centre_replicates([solve_replicate(replicate) for replicate in replicates], solution)
+        with ProcessPoolExecutor(max_workers = n_workers) as executor:
+            return centre_replicates(list(executor.map(solve_replicate, replicates)), solution)
 
 if __name__=="__main__":
     pass
\ No newline at end of file
@@ -1,57 +1,183 @@
-def calc_league_table(team_names, events, handicaps):
-    # Initialize league table with team names
-    league_table = {team_name: {'name': team_name,
-                                'played': 0,
-                                'points': handicaps[team_name] if team_name in handicaps else 0,
-                                'goal_difference': 0} for team_name in team_names}
+def init_league_table(team_names, handicaps):
+    return {team_name: {'name': team_name,
+                        'played': 0,
+                        'points': handicaps[team_name] if team_name in handicaps else 0,
+                        'goal_difference': 0} for team_name in team_names}
+
+def update_league_table(league_table, event):
+    """Adds one event's result (if it has one) to a league table keyed by team name, in place"""
+    home_team, away_team = event['name'].split(' vs ')
+    if 'score' not in event:
+        return
+    home_score, away_score = event['score']
+
+    # Update games played
+    league_table[home_team]['played'] += 1
+    league_table[away_team]['played'] += 1
+
+    # Update goal difference
+    goal_difference = home_score - away_score
+    league_table[home_team]['goal_difference'] += goal_difference
+    league_table[away_team]['goal_difference'] -= goal_difference
 
+    # Update points
+    if home_score > away_score:
+        league_table[home_team]['points'] += 3
+    elif away_score > home_score:
+        league_table[away_team]['points'] += 3
+    else:
+        league_table[home_team]['points'] += 1
+        league_table[away_team]['points'] += 1
+
+def sort_league_table(league_table):
+    """Sorted by points and then by goal difference"""
+    return sorted(league_table.values(), key=lambda x: (x['points'], x['goal_difference']), reverse=True)
+
+def calc_league_table(team_names, events, handicaps):
+    league_table = init_league_table(team_names, handicaps)
     for event in events:
-        home_team, away_team = event['name'].split(' vs ')
-        if 'score' not in event:
-            continue
-        home_score, away_score = event['score']
-
-        # Update games played
-        league_table[home_team]['played'] += 1
-        league_table[away_team]['played'] += 1
-
-        # Update goal difference
-        goal_difference = home_score - away_score
-        league_table[home_team]['goal_difference'] += goal_difference
-        league_table[away_team]['goal_difference'] -= goal_difference
-
-        # Update points
-        if home_score > away_score:
-            league_table[home_team]['points'] += 3
-        elif away_score > home_score:
-            league_table[away_team]['points'] += 3
-        else:
-            league_table[home_team]['points'] += 1
-            league_table[away_team]['points'] += 1
-
-    # Convert to a list and sort by points and then by goal difference
-    league_table_list = sorted(league_table.values(), key=lambda x: (x['points'], x['goal_difference']), reverse=True)
-
-    return league_table_list
+        update_league_table(league_table, event)
+    return sort_league_table(league_table)
 
 def filter_results_from_events(events):
     """Helper function to filter events that have scores (i.e., completed matches)"""
     return [event for event in events if 'score' in event]
 
-def calc_remaining_fixtures(team_names, events, rounds = 1):
+def init_fixture_counts(team_names, rounds = 1):
     counts={}
     for home_team_name in team_names:
         for away_team_name in team_names:
             if home_team_name != away_team_name:    
                 counts[f"{home_team_name} vs {away_team_name}"] = rounds
-    for event in events:
-        if 'score' in event:
-            counts[event["name"]]-=1
+    return counts
+
+def update_fixture_counts(counts, event):
+    """Removes a played event from the outstanding fixture counts, in place"""
+    if 'score' in event:
+        counts[event["name"]]-=1
+
+def list_fixtures(counts):
     event_names = []
     for event_name, n in counts.items():
         for i in range(n):
             event_names.append(event_name)
     return event_names
 
+def calc_remaining_fixtures(team_names, events, rounds = 1):
+    counts = init_fixture_counts(team_names, rounds)
+    for event in events:
+        update_fixture_counts(counts, event)
+    return list_fixtures(counts)
+
+def count_hosted(events):
+    counts = {}
+    for event in events:
+        counts.setdefault(event["name"], 0)
+        counts[event["name"]] += 1
+    return counts
+
+def calc_balanced_fixtures(team_names, events, meetings):
+    """Remaining fixtures when every pair of teams meets `meetings` times, hosted by the side that has hosted fewer"""
+    # post-split meetings may already have been played around a postponed pre-split fixture
+    pre_split, _ = split_results(events, meetings)
+    hosted = count_hosted(pre_split)
+    event_names = []
+    for i, home_team_name in enumerate(team_names):
+        for away_team_name in team_names[i + 1:]:
+            home_event_name = f"{home_team_name} vs {away_team_name}"
+            away_event_name = f"{away_team_name} vs {home_team_name}"
+            n_home, n_away = hosted.get(home_event_name, 0), hosted.get(away_event_name, 0)
+            for j in range(meetings - n_home - n_away):
+                if n_home <= n_away:
+                    event_names.append(home_event_name)
+                    n_home += 1
+                else:
+                    event_names.append(away_event_name)
+                    n_away += 1
+    return event_names
+
+def calc_split_fixtures(team_names, events, meetings, remaining_fixtures):
+    """One candidate post-split fixture per pair of teams yet to play theirs, hosted by the side that will have hosted fewer"""
+    pre_split, post_split = split_results(events, meetings)
+    hosted = count_hosted(pre_split + [{"name": event_name} for event_name in remaining_fixtures])
+    played = count_hosted(post_split)
+    event_names = []
+    for i, home_team_name in enumerate(team_names):
+        for away_team_name in team_names[i + 1:]:
+            home_event_name = f"{home_team_name} vs {away_team_name}"
+            away_event_name = f"{away_team_name} vs {home_team_name}"
+            if played.get(home_event_name, 0) + played.get(away_event_name, 0) > 0:
+                continue
+            if hosted.get(home_event_name, 0) <= hosted.get(away_event_name, 0):
+                event_names.append(home_event_name)
+            else:
+                event_names.append(away_event_name)
+    return event_names
+
+def split_results(events, meetings):
+    """(pre-split, post-split) results, post-split being a pair's meetings after its first `meetings`"""
+    met, pre_split, post_split = {}, [], []
+    for event in sorted(filter_results_from_events(events), key = lambda event: event.get("date", "")):
+        pair = tuple(sorted(event["name"].split(" vs ")))
+        met[pair] = met.get(pair, 0) + 1
+        (pre_split if met[pair] <= meetings else post_split).append(event)
+    return pre_split, post_split
+
+def calc_split_halves(team_names, events, handicaps, meetings, size):
+    """Top `size` teams and the rest by the table at the split point, or None if the split has not happened yet"""
+    pre_split, _ = split_results(events, meetings)
+    if len(pre_split) < meetings * len(team_names) * (len(team_names) - 1) // 2:
+        return None
+    team_names = [team["name"] for team in calc_league_table(team_names, pre_split, handicaps)]
+    return team_names[:size], team_names[size:]
+
+def calc_post_split_fixtures(team_names, events, meetings, halves):
+    """Outstanding post-split fixtures once the halves are fixed"""
+    pre_split, post_split = split_results(events, meetings)
+    hosted, played = count_hosted(pre_split), count_hosted(post_split)
+    event_names = []
+    for half in halves:
+        half = [team_name for team_name in team_names if team_name in half]
+        for i, home_team_name in enumerate(half):
+            for away_team_name in half[i + 1:]:
+                home_event_name = f"{home_team_name} vs {away_team_name}"
+                away_event_name = f"{away_team_name} vs {home_team_name}"
+                if played.get(home_event_name, 0) + played.get(away_event_name, 0) > 0:
+                    continue
+                if hosted.get(home_event_name, 0) <= hosted.get(away_event_name, 0):
+                    event_names.append(home_event_name)
+                else:
+                    event_names.append(away_event_name)
+    return event_names
+
+def calc_season_fixtures(team_names, events, handicaps, rounds = 1, split = None):
+    """(split halves or None, remaining fixtures, candidate split fixtures) for the season's current phase"""
+    if not split:
+        return None, calc_remaining_fixtures(team_names, events, rounds), []
+    halves = calc_split_halves(team_names = team_names,
+                               events = events,
+                               handicaps = handicaps,
+                               meetings = split["meetings"],
+                               size = split["size"])
+    # after the split its fixtures are known, so are among the remaining fixtures
+    if halves:
+        return halves, calc_post_split_fixtures(team_names = team_names,
+                                                events = events,
+                                                meetings = split["meetings"],
+                                                halves = halves), []
+    remaining_fixtures = calc_balanced_fixtures(team_names = team_names,
+                                                events = events,
+                                                meetings = split["meetings"])
+    return None, remaining_fixtures, calc_split_fixtures(team_names = team_names,
+                                                         events = events,
+                                                         meetings = split["meetings"],
+                                                         remaining_fixtures = remaining_fixtures)
+
+def league_format(league_name):
+    """{"rounds": .., "split": ..} for the shipped leagues"""
+    # SCO2-4 are ten team leagues in which every pair meets four times; SCO1 meets three times then splits into top and bottom six
+    return {"rounds": 2 if league_name in ["SCO2", "SCO3", "SCO4"] else 1,
+            "split": {"meetings": 3, "size": 6} if league_name == "SCO1" else None}
+
 if __name__ == "__main__":
     pass
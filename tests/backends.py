@@ -0,0 +1,75 @@
+from model.backends import Backends, init_backend
+from model.simulator import SimPoints
+import numpy as np
+
+import unittest
+
+class BackendsTest(unittest.TestCase):
+
+    def setUp(self, n_teams = 6, n_fixtures = 20, n_paths = 500, n = 11):
+        self.reference = init_backend("numpy")
+        rng = np.random.default_rng(42)
+        self.n = n
+        self.home_lambdas = rng.uniform(0, 3, n_fixtures)
+        self.away_lambdas = rng.uniform(0, 3, n_fixtures)
+        self.home_indexes = rng.integers(0, n_teams, n_fixtures)
+        self.away_indexes = (self.home_indexes + rng.integers(1, n_teams, n_fixtures)) % n_teams
+        matrices = self.reference.score_matrices(self.home_lambdas, self.away_lambdas, n, 0.1)
+        cdfs = np.cumsum(matrices.reshape(n_fixtures, -1), axis = 1)
+        self.cdfs = cdfs / cdfs[:, -1:]
+        self.uniforms = rng.random((n_fixtures, n_paths))
+        self.points = rng.random((n_teams, n_paths))
+
+    @unittest.skipUnless("numba" in Backends, "numba is not installed")
+    def test_score_matrices(self):
+        for name, backend in Backends.items():
+            self.assertTrue(np.allclose(backend.score_matrices(self.home_lambdas, self.away_lambdas, self.n, 0.1),
+                                        self.reference.score_matrices(self.home_lambdas, self.away_lambdas, self.n, 0.1)), name)
+
+    @unittest.skipUnless("numba" in Backends, "numba is not installed")
+    def test_simulate_points(self):
+        scores = self.reference.sample_scores(self.cdfs, self.uniforms)
+        reference_points = self.points.copy()
+        self.reference.simulate_points(reference_points, self.home_indexes, self.away_indexes,
+                                       self.cdfs, self.uniforms, self.n, 1e-4)
+        for name, backend in Backends.items():
+            self.assertTrue(np.array_equal(backend.sample_scores(self.cdfs, self.uniforms), scores), name)
+            points = self.points.copy()
+            backend.accumulate_points(points, self.home_indexes, self.away_indexes, scores, self.n, 1e-4)
+            self.assertTrue(np.allclose(points, reference_points), name)
+            points = self.points.copy()
+            backend.simulate_points(points, self.home_indexes, self.away_indexes,
+                                    self.cdfs, self.uniforms, self.n, 1e-4)
+            self.assertTrue(np.allclose(points, reference_points), name)
+
+    @unittest.skipUnless("numba" in Backends, "numba is not installed")
+    def test_position_counts(self):
+        positions = self.reference.positions(self.points)
+        counts = self.reference.position_counts(self.points)
+        self.assertTrue(np.all(counts.sum(axis = 0) == self.points.shape[1]))
+        for name, backend in Backends.items():
+            self.assertTrue(np.array_equal(backend.positions(self.points), positions), name)
+            self.assertTrue(np.array_equal(backend.position_counts(self.points), counts), name)
+
+    @unittest.skipUnless("numba" in Backends, "numba is not installed")
+    def test_sim_points(self):
+        position_probs = []
+        for backend in ["numpy", "numba"]:
+            sim_points = SimPoints(league_table = [{"name": name,
+                                                    "points": 0,
+                                                    "played": 0,
+                                                    "goal_difference": 0}
+                                                   for name in ["A", "B", "C"]],
+                                   n_paths = 1000,
+                                   seed = 42,
+                                   backend = backend)
+            sim_points.simulate_fixtures(event_names = ["A vs B", "B vs C", "C vs A"],
+                                         ratings = {"A": 1.5,
+                                                    "B": 1,
+                                                    "C": 0.5},
+                                         home_advantage = 1.2)
+            position_probs.append(sim_points.position_probabilities())
+        self.assertEqual(position_probs[0], position_probs[1])
+
+if __name__ == "__main__":
+    unittest.main()
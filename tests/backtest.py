@@ -0,0 +1,45 @@
+from model.backtest import backtest, calc_matchdays, calc_match_odds_metrics
+
+import json
+import unittest
+
+class BacktestTest(unittest.TestCase):
+
+    def setUp(self):
+        with open("fixtures/SCO3.json") as f:
+            self.events = json.loads(f.read())
+
+    def test_matchdays(self, n_teams = 10):
+        matchdays = calc_matchdays(self.events, n_teams)
+        self.assertEqual(sum([len(matchday) for matchday in matchdays]), len(self.events))
+        for matchday, next_matchday in zip(matchdays, matchdays[1:]):
+            self.assertTrue(len(matchday) >= n_teams // 2)
+            self.assertTrue(matchday[-1]["date"] < next_matchday[0]["date"])
+
+    def test_match_odds_metrics(self):
+        metrics = calc_match_odds_metrics(probabilities = [[1, 0, 0], [0.5, 0.3, 0.2]],
+                                          outcomes = [0, 2],
+                                          market_probs = [[1, 0, 0], [0.5, 0.3, 0.2]])
+        self.assertAlmostEqual(metrics["brier"], (0 + 0.25 + 0.09 + 0.64) / 2)
+        self.assertAlmostEqual(metrics["rms"], 0)
+
+    def test_backtest(self):
+        resps = [backtest(events = self.events,
+                          rounds = 2,
+                          n_paths = 100,
+                          max_iterations = 5,
+                          seed = 42)
+                 for i in range(2)]
+        steps, summary = resps[0]["steps"], resps[0]["summary"]
+        self.assertEqual([step["marks"] for step in steps],
+                         [step["marks"] for step in resps[1]["steps"]])
+        self.assertEqual(summary["n_steps"], len(steps))
+        self.assertTrue(summary["n_events"] > 0)
+        for step in steps:
+            self.assertAlmostEqual(sum(step["marks"].values()), 1)
+            self.assertTrue(step["n_training_events"] <= 30)
+        self.assertTrue(summary["model_log_loss"] < 1.5)
+        self.assertTrue(summary["model_rms"] < 0.2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,4 +1,4 @@
-from model.kernel import ScoreMatrix
+from model.kernel import ScoreMatrix, poisson_prob, init_matrices, batch_match_odds, batch_over_under, batch_asian_handicap, skellam_match_odds, surrogate_match_odds, SurrogateLambdaMax
 import numpy as np
 
 import unittest
@@ -38,6 +38,72 @@ class KernelTest(unittest.TestCase):
     def test_normalisation(self):
         self.assertAlmostEqual(sum(self.matrix.match_odds), 1)
 
+    def test_dixon_coles(self, home_lambda = 1.2, away_lambda = 1, rho = -0.15, n = 11):
+        goals = np.arange(n)
+        reference = (poisson_prob(home_lambda, goals[:, np.newaxis]) *
+                     poisson_prob(away_lambda, goals[np.newaxis, :]))
+        reference[:2, :2] *= [[1 - home_lambda * away_lambda * rho, 1 + home_lambda * rho],
+                              [1 + away_lambda * rho, 1 - rho]]
+        matrices = init_matrices(home_lambdas = [home_lambda],
+                                 away_lambdas = [away_lambda],
+                                 n = n,
+                                 rho = rho)
+        self.assertTrue(np.allclose(matrices[0], reference))
+
+    def test_batch_match_odds(self):
+        matrices = init_matrices(home_lambdas = [1.2, 2.5],
+                                 away_lambdas = [1, 0.5])
+        self.assertTrue(np.allclose(matrices[0], self.matrix.matrix))
+        self.assertTrue(np.allclose(batch_match_odds(matrices)[0], self.matrix.match_odds))
+
+    def line_probability(self, key_fn, line):
+        over = self.matrix.probability(lambda i, j: key_fn(i, j) > line)
+        under = self.matrix.probability(lambda i, j: key_fn(i, j) < line)
+        return np.array([over, under]) / (over + under)
+
+    def test_batch_over_under(self, lines = [2.5, 2, 2.25, 2.75]):
+        matrices = np.repeat(self.matrix.matrix[np.newaxis], len(lines), axis = 0)
+        probabilities = batch_over_under(matrices, lines)
+        for line, probs in zip(lines[:2], probabilities[:2]):
+            self.assertTrue(np.allclose(probs, self.line_probability(lambda i, j: i + j, line)))
+        for line, probs in zip(lines[2:], probabilities[2:]): # quarter lines
+            halves = [self.line_probability(lambda i, j: i + j, line + offset)
+                      for offset in [-0.25, 0.25]]
+            self.assertTrue(np.allclose(probs, (halves[0] + halves[1]) / 2))
+        self.assertTrue(probabilities[0][0] < probabilities[1][0])
+
+    def test_batch_asian_handicap(self, lines = [-0.5, 0, -0.75, 0.25]):
+        matrices = np.repeat(self.matrix.matrix[np.newaxis], len(lines), axis = 0)
+        probabilities = batch_asian_handicap(matrices, lines)
+        for line, probs in zip(lines[:2], probabilities[:2]):
+            self.assertTrue(np.allclose(probs, self.line_probability(lambda i, j: i - j, -line)))
+        for line, probs in zip(lines[2:], probabilities[2:]):
+            halves = [self.line_probability(lambda i, j: i - j, -line + offset)
+                      for offset in [-0.25, 0.25]]
+            self.assertTrue(np.allclose(probs, (halves[0] + halves[1]) / 2))
+        self.assertTrue(np.allclose(probabilities.sum(axis = 1), 1))
+
             
+    def test_surrogate_match_odds(self, n_events = 200, tolerance = 1e-6):
+        rng = np.random.default_rng(42)
+        home_lambdas = np.concatenate([rng.uniform(0, SurrogateLambdaMax, n_events), [0, SurrogateLambdaMax, SurrogateLambdaMax + 1]])
+        away_lambdas = np.concatenate([rng.uniform(0, 6, n_events), [0, SurrogateLambdaMax, 1]])
+        for rho in [0.1, -0.2]:
+            match_odds = surrogate_match_odds(home_lambdas, away_lambdas, rho = rho)
+            for (home_lambda, away_lambda), probabilities in zip(zip(home_lambdas, away_lambdas), match_odds):
+                matrix = ScoreMatrix(home_lambda, away_lambda, n = 11, rho = rho)
+                self.assertTrue(np.max(np.abs(probabilities - np.array(matrix.match_odds))) < tolerance)
+
+    def test_skellam_match_odds(self, n_events = 200, tolerance = 1e-12):
+        rng = np.random.default_rng(42)
+        home_lambdas = np.concatenate([rng.uniform(0, 9, n_events), [0, 0, 2]])
+        away_lambdas = np.concatenate([rng.uniform(0, 6, n_events), [0, 2, 0]])
+        for rho in [0.1, -0.2, 0.3]:
+            match_odds = skellam_match_odds(home_lambdas, away_lambdas, rho = rho)
+            self.assertTrue(np.max(np.abs(match_odds - batch_match_odds(init_matrices(home_lambdas, away_lambdas, rho = rho)))) < tolerance)
+            for (home_lambda, away_lambda), probabilities in list(zip(zip(home_lambdas, away_lambdas), match_odds))[-3:]:
+                matrix = ScoreMatrix(home_lambda, away_lambda, n = 11, rho = rho)
+                self.assertTrue(np.max(np.abs(probabilities - np.array(matrix.match_odds))) < tolerance)
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,160 @@
+from model.main import simulate, DefaultOutputs
+
+import json
+import unittest
+
+class MainTest(unittest.TestCase):
+
+    def setUp(self, team_names = ["Man City", "Liverpool", "Arsenal"]):
+        with open("fixtures/ENG1.json") as f:
+            self.events = [event for event in json.loads(f.read())
+                           if all(team_name in team_names
+                                  for team_name in event["name"].split(" vs "))]
+        self.ratings = {team_name: 1 for team_name in team_names}
+
+    def simulate(self, **kwargs):
+        return simulate(ratings = self.ratings,
+                        training_set = self.events,
+                        events = self.events,
+                        markets = [{"name": "Winner",
+                                    "payoff": "1|2x0"}],
+                        **dict({"max_iterations": 10,
+                                "n_paths": 100,
+                                "seed": 1}, **kwargs))
+
+    def test_default_outputs(self):
+        resp = self.simulate()
+        self.assertEqual(sorted(resp.keys()), sorted(DefaultOutputs))
+
+    def test_outputs(self):
+        resp = self.simulate(outputs = ["ratings", "rho"])
+        self.assertEqual(type(resp), dict)
+        self.assertEqual(sorted(resp.keys()), ["ratings", "rho"])
+        self.assertIn("rho", resp)
+        self.assertEqual(resp.get("rho"), resp["rho"])
+        self.assertNotIn("teams", resp)
+
+    def test_bootstrap(self, n_replicates = 8):
+        resp = self.simulate(bootstrap = {"replicates": n_replicates,
+                                          "workers": 1},
+                             outputs = ["ratings", "rating_deviations"],
+                             lazy = True)
+        for team_name, deviation in resp["rating_deviations"].items():
+            ratings = [solution["ratings"][team_name] for solution in resp.ensemble]
+            self.assertTrue(abs(sum(ratings) / n_replicates - resp["ratings"][team_name]) < deviation)
+
+    def test_lazy_default(self):
+        resp = self.simulate(lazy = True)
+        self.assertEqual(resp.outputs, {})
+        self.assertEqual(resp.stages, {})
+        self.assertEqual(resp["ratings"], self.simulate(outputs = ["ratings"])["ratings"])
+
+    def test_lazy_outputs(self):
+        resp = self.simulate(outputs = ["ratings"],
+                             lazy = True)
+        self.assertIn("ratings", resp.outputs)
+        self.assertNotIn("sim_points", resp.stages)
+        marks = resp["outright_marks"]
+        self.assertIn("sim_points", resp.stages)
+        self.assertNotIn("points_per_game_ratings", resp.stages)
+        self.assertEqual(marks, self.simulate()["outright_marks"])
+        with self.assertRaises(KeyError):
+            resp["unknown"]
+        with self.assertRaises(RuntimeError):
+            self.simulate(outputs = ["unknown"])
+
+    def test_n_workers(self):
+        self.assertEqual(self.simulate(n_paths = 2000, n_workers = 2)["teams"],
+                         self.simulate(n_paths = 2000)["teams"])
+
+    def test_post_split(self, team_names = ["A", "B", "C", "D"]):
+        events = [{"name": event_name,
+                   "score": score,
+                   "match_odds": {"prices": [2.2, 3.4, 3.4]}}
+                  for event_name, score in [("A vs B", (1, 0)),
+                                            ("C vs D", (0, 0)),
+                                            ("A vs C", (2, 0)),
+                                            ("D vs B", (0, 1)),
+                                            ("D vs A", (1, 1)),
+                                            ("B vs C", (3, 1)),
+                                            ("B vs A", (2, 2))]]
+        resp = simulate(ratings = {team_name: 1 for team_name in team_names},
+                        training_set = events,
+                        events = events,
+                        markets = [{"name": "Winner",
+                                    "payoff": "1|3x0"}],
+                        split = {"meetings": 1, "size": 2},
+                        max_iterations = 10,
+                        n_paths = 100,
+                        seed = 1,
+                        lazy = True)
+        self.assertEqual(resp.remaining_fixtures, ["D vs C"])
+        self.assertEqual(resp.split_fixtures, [])
+        self.assertAlmostEqual(sum([mark["mark"] for mark in resp["outright_marks"]]), 1)
+
+    def test_postponed_pre_split(self, team_names = ["A", "B", "C", "D"]):
+        events = [{"name": event_name,
+                   "date": date,
+                   "score": (1, 0),
+                   "match_odds": {"prices": [2.2, 3.4, 3.4]}}
+                  for event_name, date in [("A vs B", "2024-01-01"),
+                                           ("A vs C", "2024-01-08"),
+                                           ("D vs B", "2024-01-08"),
+                                           ("D vs A", "2024-01-15"),
+                                           ("B vs C", "2024-01-15"),
+                                           ("B vs A", "2024-01-22")]]
+        resp = simulate(ratings = {team_name: 1 for team_name in team_names},
+                        training_set = events,
+                        events = events,
+                        markets = [{"name": "Winner",
+                                    "payoff": "1|3x0"}],
+                        split = {"meetings": 1, "size": 2},
+                        max_iterations = 10,
+                        n_paths = 100,
+                        seed = 1,
+                        lazy = True)
+        self.assertEqual(resp.remaining_fixtures, ["C vs D"])
+        self.assertEqual(len(resp.split_fixtures), 5)
+        self.assertAlmostEqual(sum([mark["mark"] for mark in resp["outright_marks"]]), 1)
+
+    def test_points_distributions(self):
+        resp = self.simulate(outputs = ["teams", "points_distributions"],
+                             points_bands = [[None, 79], [80, None]])
+        for team in resp["teams"]:
+            distribution = resp["points_distributions"][team["name"]]
+            self.assertEqual(team["expected_season_points"], distribution["mean"])
+            self.assertAlmostEqual(sum(distribution["bands"]), 1)
+            self.assertEqual(distribution["quantiles"], sorted(distribution["quantiles"]))
+
+    def test_playoff(self):
+        self.setUp(team_names = ["Man City", "Liverpool", "Arsenal", "Chelsea"])
+        resp = simulate(ratings = self.ratings,
+                        training_set = self.events,
+                        events = self.events,
+                        markets = [{"name": "Playoff",
+                                    "payoff": "4x0",
+                                    "playoff": {"positions": [1, 2, 3, 4],
+                                                "payoff": 1}}],
+                        max_iterations = 10,
+                        n_paths = 100,
+                        seed = 1,
+                        outputs = ["outright_marks", "playoff_probabilities"],
+                        lazy = True)
+        marks = {mark["team"]: mark["mark"] for mark in resp["outright_marks"]}
+        self.assertEqual(marks, resp["playoff_probabilities"]["Playoff"])
+        self.assertAlmostEqual(sum(marks.values()), 1)
+        with self.assertRaises(RuntimeError):
+            resp["outright_sensitivities"]
+
+    def test_outright_sensitivities(self):
+        resp = self.simulate(outputs = ["outright_marks"],
+                             lazy = True)
+        sensitivities = resp["outright_sensitivities"]
+        self.assertEqual([sensitivity["mark"] for sensitivity in sensitivities],
+                         [mark["mark"] for mark in resp["outright_marks"]])
+        for sensitivity in sensitivities:
+            self.assertEqual(sorted(sensitivity["ratings"].keys()), sorted(self.ratings.keys()))
+            self.assertIn("home_advantage", sensitivity)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -17,6 +17,27 @@ class MarketsTest(unittest.TestCase):
                                      "exclude": "A"}])
         except Exception as error:
             self.fail(str(error))
+
+    def test_playoff(self, team_names = ["A", "B", "C", "D", "E", "F"]):
+        markets = [{"name": "Promotion",
+                    "payoff": "1|5x0",
+                    "playoff": {"positions": [2, 3, 4, 5]}}]
+        init_markets(team_names = team_names,
+                     markets = markets)
+        self.assertEqual(markets[0]["playoff"]["payoff"], 1)
+        for market in [{"name": "Positions",
+                        "payoff": "1|5x0",
+                        "playoff": {"positions": [4, 5, 6, 7]}},
+                       {"name": "Duplicates",
+                        "payoff": "1|5x0",
+                        "playoff": {"positions": [2, 3, 3, 4]}},
+                       {"name": "Include",
+                        "payoff": "1|0",
+                        "include": ["A", "B"],
+                        "playoff": {"positions": [1, 2, 3, 4]}}]:
+            with self.assertRaises(RuntimeError):
+                init_markets(team_names = team_names,
+                             markets = [market])
             
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,40 @@
+from model.optimisers import Optimisers
+import numpy as np
+
+import unittest
+
+class OptimisersTest(unittest.TestCase):
+
+    def setUp(self):
+        self.options = {"maxiter": 500,
+                        "population_size": 8,
+                        "mutation_factor": 0.1,
+                        "elite_ratio": 0.2,
+                        "init_std": 1.0,
+                        "log_interval": 100,
+                        "decay_exponent": 0.5,
+                        "mutation_probability": 0.3,
+                        "exploration_interval": 50,
+                        "n_exploration_points": 2,
+                        "differential_weight": 0.8,
+                        "crossover_probability": 0.9,
+                        "excellent_error": 1e-3,
+                        "max_error": 1e-2}
+
+    def test_optimisers(self, target = [1, 2, 3], bounds = [(0, 6)] * 3):
+        def objective(params):
+            return float(np.sum((np.array(params) - target) ** 2))
+        for name, optimiser in Optimisers.items():
+            result = optimiser(objective,
+                               [5, 5, 5],
+                               bounds = bounds,
+                               options = self.options,
+                               seed = 42)
+            self.assertTrue(result.fun <= self.options["excellent_error"], name)
+            self.assertTrue(all(low <= x <= high
+                                for x, (low, high) in zip(result.x, bounds)), name)
+            self.assertTrue(result.evaluations_to_target <= result.n_evaluations, name)
+            self.assertEqual(result.fun, objective(result.x))
+
+if __name__ == "__main__":
+    unittest.main()
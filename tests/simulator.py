@@ -1,4 +1,4 @@
-from model.simulator import SimPoints
+from model.simulator import SimPoints, SimPointsPool
 import numpy as np
 
 import unittest
@@ -22,6 +22,205 @@ class SimTest(unittest.TestCase):
             self.assertEqual(len(team_names), len(position_probs))
             for team_name in team_names:
                 self.assertAlmostEqual(sum(position_probs[team_name]), 1)
+
+    def init_sim_points(self, n_paths,
+                        ratings = {"A": 1.5,
+                                   "B": 1,
+                                   "C": 0.5},
+                        home_advantage = 1.2,
+                        **kwargs):
+        sim_points = SimPoints(league_table = [{"name": name,
+                                                "points": 0,
+                                                "played": 0,
+                                                "goal_difference": 0}
+                                               for name in ["A", "B", "C"]],
+                               n_paths = n_paths,
+                               **kwargs)
+        for event_name in ["A vs B", "B vs C", "C vs A"]:
+            sim_points.simulate(event_name = event_name,
+                                ratings = ratings,
+                                home_advantage = home_advantage)
+        return sim_points
+
+    def test_reproducibility(self, n_paths = 1000, chunk_size = 250):
+        serial = self.init_sim_points(n_paths, seed = 42, chunk_size = chunk_size)
+        self.assertTrue(np.array_equal(serial.points,
+                                       self.init_sim_points(n_paths, seed = 42, chunk_size = chunk_size).points))
+        blocks = [self.init_sim_points(n_paths // 2,
+                                       seed = 42,
+                                       chunk_size = chunk_size,
+                                       chunk_offset = chunk_offset)
+                  for chunk_offset in [0, 2]]
+        self.assertTrue(np.array_equal(serial.points,
+                                       np.concatenate([block.points for block in blocks], axis = 1)))
+        self.assertFalse(np.array_equal(serial.points,
+                                        self.init_sim_points(n_paths, seed = 43, chunk_size = chunk_size).points))
+
+    def test_split(self, team_names = ["A", "B", "C", "D"], split_size = 2, n_paths = 1000):
+        sim_points = SimPoints(league_table = [{"name": name,
+                                                "points": 0,
+                                                "played": 0,
+                                                "goal_difference": 0}
+                                               for name in team_names],
+                               n_paths = n_paths,
+                               seed = 42)
+        ratings = {"A": 2, "B": 1.5, "C": 1, "D": 0.5}
+        sim_points.simulate_fixtures(event_names = [f"{home_team_name} vs {away_team_name}"
+                                                    for home_team_name in team_names
+                                                    for away_team_name in team_names
+                                                    if home_team_name != away_team_name],
+                                     ratings = ratings,
+                                     home_advantage = 1.2)
+        pre_split_points = sim_points.points.copy()
+        top_half = np.argsort(np.argsort(-pre_split_points, axis = 0), axis = 0) < split_size
+        split_fixtures = [f"{home_team_name} vs {away_team_name}"
+                          for i, home_team_name in enumerate(team_names)
+                          for away_team_name in team_names[i + 1:]]
+        mask = sim_points.simulate_split(event_names = split_fixtures,
+                                         ratings = ratings,
+                                         home_advantage = 1.2,
+                                         split_size = split_size)
+        self.assertTrue(np.all(mask.sum(axis = 0) == 2)) # one fixture per half on every path
+        for event_name, fixture_mask in zip(split_fixtures, mask):
+            i, j = [team_names.index(team_name) for team_name in event_name.split(" vs ")]
+            self.assertTrue(np.array_equal(fixture_mask, top_half[i] == top_half[j]))
+        added_points = np.round(sim_points.points - pre_split_points)
+        self.assertTrue(np.all((added_points.sum(axis = 0) >= 4) & (added_points.sum(axis = 0) <= 6)))
+        self.assertTrue(0.5 < np.mean(top_half[0]) < 1)
+
+    def test_points_distributions(self, n_paths = 1000, bands = [[None, 2], [3, 4], [5, None]]):
+        sim_points = self.init_sim_points(n_paths = n_paths, seed = 42)
+        points = np.rint(sim_points.points)
+        distributions = sim_points.points_distributions(bands = bands)
+        for i, team_name in enumerate(sim_points.team_names):
+            distribution = distributions[team_name]
+            self.assertAlmostEqual(distribution["mean"], points[i].mean())
+            self.assertEqual(distribution["quantiles"],
+                             np.quantile(points[i], SimPoints.PointsQuantiles, method = "inverted_cdf").tolist())
+            self.assertAlmostEqual(sum(distribution["bands"]), 1)
+            self.assertAlmostEqual(distribution["bands"][1], np.mean((points[i] >= 3) & (points[i] <= 4)))
+
+    def test_playoff(self, team_names = ["A", "B", "C", "D", "E", "F"], n_paths = 2000, chunk_size = 500, positions = [2, 3, 4, 5]):
+        league_table = [{"name": name,
+                         "points": 0,
+                         "played": 0,
+                         "goal_difference": 0}
+                        for name in team_names]
+        ratings = {"A": 3, "B": 2, "C": 1.5, "D": 1, "E": 0.75, "F": 0.5}
+        event_names = [f"{home_team_name} vs {away_team_name}"
+                       for home_team_name in team_names
+                       for away_team_name in team_names
+                       if home_team_name != away_team_name]
+        sim_points = SimPoints(league_table, n_paths, seed = 42, chunk_size = chunk_size)
+        sim_points.simulate_fixtures(event_names, ratings, 1.2)
+        winners = sim_points.simulate_playoff(positions, ratings, 1.2)
+        positions_array = sim_points.backend.positions(sim_points.points)
+        self.assertTrue(np.all(np.isin(positions_array[winners, np.arange(n_paths)] + 1, positions)))
+        probabilities = sim_points.playoff_probabilities(positions)
+        self.assertAlmostEqual(sum(probabilities.values()), 1)
+        # B is usually the strongest team to finish in the playoff places
+        self.assertGreater(probabilities["B"], probabilities["E"])
+        with self.assertRaises(RuntimeError):
+            sim_points.playoff_probabilities([1, 2, 3, 4])
+        with self.assertRaises(RuntimeError):
+            sim_points.simulate_playoff([1, 2, 3], ratings, 1.2)
+
+    def test_pool(self, team_names = ["A", "B", "C", "D"], n_paths = 5000, chunk_size = 1000, split_size = 2):
+        league_table = [{"name": name,
+                         "points": i,
+                         "played": 0,
+                         "goal_difference": 0}
+                        for i, name in enumerate(team_names)]
+        ratings = {"A": 2, "B": 1.5, "C": 1, "D": 0.5}
+        event_names = [f"{home_team_name} vs {away_team_name}"
+                       for home_team_name in team_names
+                       for away_team_name in team_names
+                       if home_team_name != away_team_name]
+        split_fixtures = [f"{home_team_name} vs {away_team_name}"
+                          for i, home_team_name in enumerate(team_names)
+                          for away_team_name in team_names[i + 1:]]
+        sim_points = SimPoints(league_table, n_paths, seed = 42, chunk_size = chunk_size)
+        sim_points.simulate_fixtures(event_names, ratings, 1.2)
+        sim_points.simulate_split(split_fixtures, ratings, 1.2, split_size = split_size)
+        sim_points.simulate_playoff([1, 2, 3, 4], ratings, 1.2)
+        for n_workers in [1, 3]:
+            pool = SimPointsPool(league_table, n_paths, seed = 42, chunk_size = chunk_size, n_workers = n_workers)
+            pool.simulate(event_names, ratings, 1.2,
+                          split_fixtures = split_fixtures,
+                          split_size = split_size,
+                          groups = [None, ["D", "A", "B"]],
+                          playoffs = [[1, 2, 3, 4]])
+            for group in [None, ["A", "B", "D"]]:
+                self.assertEqual(pool.position_probabilities(team_names = group),
+                                 sim_points.position_probabilities(team_names = group))
+            self.assertEqual(pool.playoff_probabilities([1, 2, 3, 4]),
+                             sim_points.playoff_probabilities([1, 2, 3, 4]))
+            self.assertEqual(pool.points_distributions(bands = [[None, 5], [6, None]]),
+                             sim_points.points_distributions(bands = [[None, 5], [6, None]]))
+        with self.assertRaises(RuntimeError):
+            pool.position_probabilities(team_names = ["A", "B"])
+
+    def test_ensemble(self, n_paths = 1000, chunk_size = 250):
+        league_table = [{"name": name,
+                         "points": 0,
+                         "played": 0,
+                         "goal_difference": 0}
+                        for name in ["A", "B"]]
+        ensemble = [{"ratings": {"A": 3, "B": 0}, "home_advantage": 1, "rho": 0},
+                    {"ratings": {"A": 0, "B": 3}, "home_advantage": 1, "rho": 0}]
+        for chunk_offset in [0, 1]:
+            sim_points = SimPoints(league_table = league_table,
+                                   n_paths = n_paths,
+                                   seed = 42,
+                                   chunk_size = chunk_size,
+                                   chunk_offset = chunk_offset)
+            sim_points.simulate_fixtures(event_names = ["A vs B"],
+                                         ratings = {"A": 1, "B": 1},
+                                         home_advantage = 1.2,
+                                         ensemble = ensemble)
+            # B cannot score under the first replicate, nor A under the second
+            for i in range(n_paths // chunk_size):
+                block = sim_points.points[:, i * chunk_size: (i + 1) * chunk_size]
+                winner = 0 if (chunk_offset + i) % 2 == 0 else 1
+                self.assertTrue(np.all(np.round(block[winner] - block[1 - winner]) >= 0))
+
+    def test_mark_sensitivities(self, team_names = ["A", "B", "C"], n_paths = 20000):
+        sim_points = self.init_sim_points(n_paths, seed = 42, sensitivities = True)
+        self.assertTrue(np.array_equal(sim_points.points,
+                                       self.init_sim_points(n_paths, seed = 42).points)) # same paths
+        position_probs = sim_points.position_probabilities()
+        sensitivities = sim_points.mark_sensitivities(payoff = [1, 0, 0])
+        for team_name in team_names:
+            self.assertAlmostEqual(sensitivities[team_name]["mark"], position_probs[team_name][0])
+            self.assertTrue(sensitivities[team_name]["ratings"][team_name] > 0)
+            for other_team_name in team_names:
+                if other_team_name != team_name:
+                    self.assertTrue(sensitivities[team_name]["ratings"][other_team_name] < 0)
+        for team_name in team_names + ["home_advantage"]:
+            total = sum([(sensitivities[name]["home_advantage"] if team_name == "home_advantage" else
+                          sensitivities[name]["ratings"][team_name])
+                         for name in team_names])
+            self.assertAlmostEqual(total, 0) # marks always sum to the total payoff
+        with self.assertRaises(RuntimeError):
+            self.init_sim_points(10).mark_sensitivities(payoff = [1, 0, 0])
+
+    def test_mark_sensitivities_finite_differences(self, n_paths = 100000, step = 0.1, tolerance = 0.03):
+        ratings, home_advantage = {"A": 1.5, "B": 1, "C": 0.5}, 1.2
+        sensitivities = self.init_sim_points(n_paths, seed = 42, sensitivities = True).mark_sensitivities(payoff = [1, 0, 0])
+        for param in list(ratings.keys()) + ["home_advantage"]:
+            bumped_probs = []
+            for bump in [step, -step]:
+                bumped_ratings = dict(ratings)
+                if param in bumped_ratings:
+                    bumped_ratings[param] += bump
+                bumped_probs.append(self.init_sim_points(n_paths,
+                                                         ratings = bumped_ratings,
+                                                         home_advantage = home_advantage + (bump if param == "home_advantage" else 0),
+                                                         seed = 42).position_probabilities()) # common random numbers
+            for team_name in ratings:
+                finite_difference = (bumped_probs[0][team_name][0] - bumped_probs[1][team_name][0]) / (2 * step)
+                gradient = sensitivities[team_name]["home_advantage"] if param == "home_advantage" else sensitivities[team_name]["ratings"][param]
+                self.assertTrue(abs(gradient - finite_difference) < tolerance, (team_name, param, gradient, finite_difference))
                             
 if __name__ == "__main__":
     unittest.main()
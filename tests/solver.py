@@ -1,4 +1,7 @@
-from model.solver import RatingsSolver, RatingRange, HomeAdvantageRange
+from model.optimisers import Optimisers
+from model.kernel import Rho
+from model.solver import RatingsSolver, TrainingSet, IncrementalObjective, RatingRange, HomeAdvantageRange, RhoRange, MatchOdds, OverUnder, AsianHandicap
+import numpy as np
 
 import json
 import random
@@ -51,6 +54,189 @@ class SolverTest(unittest.TestCase):
         self.assertTrue(solver_resp["error"] < 0.1)
         initial_bias = sum(HomeAdvantageRange) / 2
         self.assertTrue(abs(solver_resp["home_advantage"] - initial_bias) > 0.01)
+
+    def test_rho(self,
+                 team_names = ["Man City",
+                               "Liverpool",
+                               "Arsenal",
+                               "Chelsea",
+                               "Tottenham"],
+                 margin = 0.05):
+        events = self.filter_events(team_names)
+        ratings = {team_name: 1 for team_name in team_names}
+        solver = RatingsSolver()
+        solver_resp = solver.solve(events = events,
+                                   ratings = ratings,
+                                   rho = None,
+                                   optimiser = "cma_es",
+                                   excellent_error = 0,
+                                   max_iterations = 400,
+                                   seed = 1)
+        self.assertTrue(solver_resp["error"] < 0.1)
+        # the fitted rho is an interior optimum, not pinned to either bound
+        self.assertTrue(RhoRange[0] + margin < solver_resp["rho"] < RhoRange[1] - margin)
+
+    def test_optimisers(self,
+                        team_names = ["Man City",
+                                      "Liverpool",
+                                      "Arsenal"]):
+        events = self.filter_events(team_names)
+        solver = RatingsSolver()
+        for optimiser in Optimisers:
+            solver_resp = solver.solve(events = events,
+                                       ratings = {team_name: 1 for team_name in team_names},
+                                       max_iterations = 500,
+                                       optimiser = optimiser)
+            self.assertTrue(solver_resp["error"] < 0.1, optimiser)
+            self.assertTrue(solver_resp["n_evaluations"] > 0)
+
+    def test_incremental_objective(self):
+        team_names = sorted(list(set([team_name
+                                      for event in self.events
+                                      for team_name in event["name"].split(" vs ")])))
+        training_set = TrainingSet(events = self.events,
+                                   team_names = team_names)
+        objective = IncrementalObjective(training_set = training_set,
+                                         unpack = lambda params: (params[:-1], params[-1], Rho),
+                                         n_teams = len(team_names))
+        rng = np.random.default_rng(42)
+        parent = np.append(rng.uniform(*RatingRange, len(team_names)), 1.2)
+        parent_error, parent_errors = objective.evaluate(parent)
+        for mutated in [[0], [3, 7], [len(team_names)]]:
+            child = parent.copy()
+            child[mutated] += 0.1
+            error, errors = objective.evaluate(child, (parent, parent_errors))
+            self.assertAlmostEqual(error, objective(child))
+            self.assertTrue(np.allclose(errors, training_set.event_errors(ratings = child[:-1],
+                                                                          home_advantage = child[-1])))
+        self.assertTrue(0 < objective.saving < 1)
+
+    def test_seed(self,
+                  team_names = ["Man City",
+                                "Liverpool",
+                                "Arsenal"]):
+        events = self.filter_events(team_names)
+        solver = RatingsSolver()
+        solver_resps = [solver.solve(events = events,
+                                     ratings = {team_name: 1 for team_name in team_names},
+                                     max_iterations = 20,
+                                     excellent_error = 0,
+                                     seed = 42)
+                        for i in range(2)]
+        self.assertEqual(solver_resps[0], solver_resps[1])
+
+    def test_bootstrap(self,
+                       team_names = ["Man City",
+                                     "Liverpool",
+                                     "Arsenal"],
+                       n_replicates = 4):
+        events = self.filter_events(team_names)
+        solver = RatingsSolver()
+        solution = solver.solve(events = events,
+                                ratings = {team_name: 1 for team_name in team_names},
+                                max_iterations = 20,
+                                seed = 42)
+        replicates = [solver.bootstrap(events = events,
+                                       solution = solution,
+                                       n_replicates = n_replicates,
+                                       n_workers = n_workers,
+                                       seed = 42)
+                      for n_workers in [1, 2]]
+        self.assertEqual(replicates[0], replicates[1]) # serial and parallel agree
+        self.assertEqual(len(replicates[0]), n_replicates)
+        self.assertTrue(len(set([replicate["ratings"]["Liverpool"] for replicate in replicates[0]])) > 1)
+        for replicate in replicates[0]:
+            self.assertTrue(abs(replicate["home_advantage"] - solution["home_advantage"]) < 0.25)
+
+    def test_bootstrap_centred(self,
+                               team_names = ["Man City",
+                                             "Liverpool",
+                                             "Arsenal",
+                                             "Chelsea"],
+                               n_replicates = 8):
+        events = self.filter_events(team_names)
+        solver = RatingsSolver()
+        solution = solver.converge(events = events,
+                                   solution = solver.solve(events = events,
+                                                           ratings = {team_name: 1 for team_name in team_names},
+                                                           max_iterations = 20,
+                                                           seed = 42),
+                                   seed = 42)
+        replicates = solver.bootstrap(events = events,
+                                      solution = solution,
+                                      n_replicates = n_replicates,
+                                      n_workers = 1,
+                                      seed = 42,
+                                      converged = True)
+        for team_name in team_names:
+            ratings = [replicate["ratings"][team_name] for replicate in replicates]
+            self.assertTrue(abs(np.mean(ratings) - solution["ratings"][team_name]) < np.std(ratings)) # the ensemble is centred on its base
+
+    def test_bootstrap_convergence(self,
+                                   team_names = ["Man City",
+                                                 "Liverpool",
+                                                 "Arsenal",
+                                                 "Chelsea"],
+                                   n_replicates = 4):
+        events = self.filter_events(team_names)
+        solver = RatingsSolver()
+        solution = solver.solve(events = events,
+                                ratings = {team_name: 1 for team_name in team_names},
+                                max_iterations = 20,
+                                seed = 42)
+        spreads = []
+        for max_iterations in [200, 1000]:
+            replicates = solver.bootstrap(events = events,
+                                          solution = solution,
+                                          n_replicates = n_replicates,
+                                          max_iterations = max_iterations,
+                                          n_workers = 1,
+                                          seed = 42)
+            spreads.append(np.mean([np.std([replicate["ratings"][team_name] for replicate in replicates])
+                                    for team_name in team_names]))
+        self.assertTrue(spreads[0] > 0)
+        self.assertTrue(abs(spreads[0] - spreads[1]) < 0.1 * spreads[1]) # replicates stop on convergence, not max_iterations
+
+    def test_surrogate(self):
+        team_names = sorted(list({team_name
+                                  for event in self.events
+                                  for team_name in event["name"].split(" vs ")}))
+        ratings = np.random.default_rng(42).uniform(*RatingRange, len(team_names))
+        errors = [TrainingSet(events = self.events,
+                              team_names = team_names,
+                              surrogate = surrogate).error(ratings = ratings,
+                                                           home_advantage = 1.2)
+                  for surrogate in [False, True]]
+        self.assertAlmostEqual(errors[0], errors[1], places = 5)
+        self.assertFalse(TrainingSet(events = self.events,
+                                     team_names = team_names,
+                                     fit_markets = [MatchOdds, OverUnder],
+                                     surrogate = True).surrogate)
+
+    def test_fit_markets(self):
+        events = [{"name": "A vs B",
+                   "match_odds": {"prices": [2, 3.4, 4]},
+                   "over_under": {"line": 2.5,
+                                  "prices": [2.1, 1.8]},
+                   "asian_handicap": {"line": -0.25,
+                                      "prices": [1.95, 1.95]}},
+                  {"name": "B vs A",
+                   "match_odds": {"prices": [3, 3.3, 2.4]}}]
+        ratings = {"A": 1.6, "B": 1.2}
+        solver = RatingsSolver()
+        errors = [solver.calc_error(events = events,
+                                    ratings = ratings,
+                                    home_advantage = 1.2,
+                                    fit_markets = fit_markets)
+                  for fit_markets in [[MatchOdds],
+                                      [MatchOdds, OverUnder, AsianHandicap]]]
+        self.assertTrue(all(error > 0 for error in errors))
+        self.assertNotEqual(errors[0], errors[1])
+        solver_resp = solver.solve(events = events,
+                                   ratings = ratings,
+                                   max_iterations = 200,
+                                   fit_markets = [MatchOdds, OverUnder, AsianHandicap])
+        self.assertTrue(solver_resp["error"] < 0.1)
                             
 if __name__ == "__main__":
     unittest.main()
@@ -1,4 +1,4 @@
-from model.state import calc_league_table, calc_remaining_fixtures
+from model.state import calc_league_table, calc_remaining_fixtures, calc_balanced_fixtures, calc_split_fixtures, calc_split_halves, calc_post_split_fixtures, calc_season_fixtures, league_format
 
 import unittest
 
@@ -36,6 +36,89 @@ class StateTest(unittest.TestCase):
         for event_name in event_names:
             self.assertTrue(event_name in remaining_fixtures)
         self.assertEqual(len(event_names), len(remaining_fixtures))
+
+    def test_split_fixtures(self):
+        team_names = ["A", "B", "C"]
+        events = [{"name": "A vs B",
+                   "score": (1, 0)},
+                  {"name": "B vs A",
+                   "score": (2, 2)},
+                  {"name": "C vs B",
+                   "score": (0, 1)}]
+        remaining_fixtures = calc_balanced_fixtures(team_names = team_names,
+                                                    events = events,
+                                                    meetings = 3)
+        self.assertEqual(sorted(remaining_fixtures), ['A vs B', 'A vs C', 'A vs C', 'B vs C', 'B vs C', 'C vs A'])
+        split_fixtures = calc_split_fixtures(team_names = team_names,
+                                             events = events,
+                                             meetings = 3,
+                                             remaining_fixtures = remaining_fixtures)
+        self.assertEqual(sorted(split_fixtures), ['B vs A', 'C vs A', 'C vs B'])
+
+    def test_postponed_fixtures(self, team_names = ["A", "B", "C", "D"]):
+        # C vs D is postponed, and A and B have already played their post-split meeting
+        events = [{"name": event_name, "date": date, "score": (1, 0)}
+                  for event_name, date in [("A vs B", "2024-01-01"),
+                                           ("A vs C", "2024-01-08"),
+                                           ("D vs B", "2024-01-08"),
+                                           ("D vs A", "2024-01-15"),
+                                           ("B vs C", "2024-01-15"),
+                                           ("B vs A", "2024-01-22")]]
+        self.assertEqual(calc_split_halves(team_names = team_names,
+                                           events = events,
+                                           handicaps = {},
+                                           meetings = 1,
+                                           size = 2), None)
+        remaining_fixtures = calc_balanced_fixtures(team_names = team_names,
+                                                    events = events,
+                                                    meetings = 1)
+        self.assertEqual(remaining_fixtures, ["C vs D"])
+        split_fixtures = calc_split_fixtures(team_names = team_names,
+                                             events = events,
+                                             meetings = 1,
+                                             remaining_fixtures = remaining_fixtures)
+        self.assertEqual(sorted(split_fixtures), ["A vs D", "B vs D", "C vs A", "C vs B", "D vs C"])
+
+    def test_post_split_fixtures(self, team_names = ["A", "B", "C", "D"]):
+        events = [{"name": "A vs B", "score": (1, 0)},
+                  {"name": "C vs D", "score": (0, 0)},
+                  {"name": "A vs C", "score": (2, 0)},
+                  {"name": "D vs B", "score": (0, 1)},
+                  {"name": "D vs A", "score": (1, 1)},
+                  {"name": "B vs C", "score": (3, 1)}]
+        self.assertEqual(calc_split_halves(team_names = team_names,
+                                           events = events[:-1],
+                                           handicaps = {},
+                                           meetings = 1,
+                                           size = 2), None)
+        # one post-split meeting played, which the pre-split fixtures must not count
+        events.append({"name": "B vs A", "score": (2, 2)})
+        halves = calc_split_halves(team_names = team_names,
+                                   events = events,
+                                   handicaps = {},
+                                   meetings = 1,
+                                   size = 2)
+        self.assertEqual(halves, (["A", "B"], ["D", "C"]))
+        self.assertEqual(calc_post_split_fixtures(team_names = team_names,
+                                                  events = events,
+                                                  meetings = 1,
+                                                  halves = halves), ["D vs C"])
+
+    def test_season_fixtures(self, team_names = ["A", "B", "C", "D"]):
+        events = [{"name": "A vs B", "score": (1, 0)},
+                  {"name": "C vs D", "score": (0, 0)}]
+        self.assertEqual(calc_season_fixtures(team_names, events, {}, rounds = 2),
+                         (None, calc_remaining_fixtures(team_names, events, rounds = 2), []))
+        halves, remaining_fixtures, split_fixtures = calc_season_fixtures(team_names, events, {},
+                                                                          split = {"meetings": 1, "size": 2})
+        self.assertEqual(halves, None)
+        self.assertEqual(len(remaining_fixtures), 4)
+        self.assertEqual(len(split_fixtures), 6)
+
+    def test_league_format(self):
+        self.assertEqual(league_format("ENG1"), {"rounds": 1, "split": None})
+        self.assertEqual(league_format("SCO2"), {"rounds": 2, "split": None})
+        self.assertEqual(league_format("SCO1"), {"rounds": 1, "split": {"meetings": 3, "size": 6}})
             
 if __name__ == "__main__":
     unittest.main()